@@ -1,6 +1,6 @@
 ﻿from django.contrib import admin
 
-from .models import Action, Customer, EditLog, Order, Payment, Profile, Visit
+from .models import Action, Customer, EditLog, Order, Payment, Profile, ProfileCode, Visit
 from .services import finalize_payment
 
 
@@ -16,6 +16,12 @@ class ProfileAdmin(admin.ModelAdmin):
     search_fields = ("code", "slug", "customer__full_name")
 
 
+@admin.register(ProfileCode)
+class ProfileCodeAdmin(admin.ModelAdmin):
+    list_display = ("code", "batch", "encoded_at", "claimed_at", "created_at")
+    search_fields = ("code", "batch")
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "customer", "package", "status", "created_at")
@@ -12,8 +12,12 @@ urlpatterns = [
     path("profiles/<int:pk>/", views_admin.ProfileDetailView.as_view(), name="admin-profile-detail"),
     path("profiles/<int:pk>/edit/", views_admin.ProfileEditView.as_view(), name="admin-profile-edit"),
     path("orders/", views_admin.OrdersListView.as_view(), name="admin-orders"),
+    path("orders/import/", views_admin.OrderImportView.as_view(), name="admin-order-import"),
+    path("orders/import/<str:job_id>/", views_admin.OrderImportStatusView.as_view(), name="admin-order-import-status"),
     path("orders/<int:pk>/", views_admin.OrderDetailView.as_view(), name="admin-order-detail"),
+    path("search/", views_admin.SearchView.as_view(), name="admin-search"),
     path("analytics/", views_admin.AnalyticsView.as_view(), name="admin-analytics"),
+    path("analytics/export/", views_admin.EventExportView.as_view(), name="admin-analytics-export"),
     path("analytics/profiles/<int:pk>/", views_admin.ProfileAnalyticsView.as_view(), name="admin-profile-analytics"),
     path("renewals/", views_admin.RenewalsView.as_view(), name="admin-renewals"),
     path("renewals/<int:pk>/extend/", views_admin.RenewalExtendView.as_view(), name="admin-renewals-extend"),
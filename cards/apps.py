@@ -4,3 +4,16 @@
 class CardsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cards"
+
+    def ready(self):
+        from django.db.models.signals import post_save, pre_save
+
+        from .caching import invalidate_saved_profile_page, remember_profile_page_keys
+        from .models import Profile
+        from .resolver import publish_profile_change
+
+        pre_save.connect(remember_profile_page_keys, sender=Profile, dispatch_uid="cards.remember_profile_page_keys")
+        post_save.connect(publish_profile_change, sender=Profile, dispatch_uid="cards.publish_profile_change")
+        post_save.connect(
+            invalidate_saved_profile_page, sender=Profile, dispatch_uid="cards.invalidate_saved_profile_page"
+        )
@@ -0,0 +1,73 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    # Per-worker buffer written to the database by a daemon thread every
+    # flush_interval seconds (or sooner, after wake()). Subclasses implement
+    # _reset/_take/_write/_requeue; whatever _write returns as unwritten is
+    # put back for the next flush, so a failed flush loses nothing.
+    flush_interval = 5
+    thread_name = "write-behind"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._reset()
+
+    def _ensure_worker(self):
+        # Started lazily so each forked worker process gets its own flusher
+        # and drops anything buffered by its parent.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._reset()
+        thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("%s flush failed", self.thread_name)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending = self._take()
+            failed = self._write(pending)
+            if failed:
+                with self._lock:
+                    self._requeue(failed)
+            return len(pending) - len(failed or ())
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _take(self):
+        raise NotImplementedError
+
+    def _write(self, pending):
+        raise NotImplementedError
+
+    def _requeue(self, failed):
+        raise NotImplementedError
@@ -0,0 +1,341 @@
+import csv
+import io
+import os
+import secrets
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import PurePath
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .constants import HOSTING_INCLUDED_YEARS
+from .forms import BulkOrderRowForm
+from .models import Customer, Order, Profile
+from .phones import normalize_phone
+from .resolver import profile_resolver
+from .services import (
+    build_content,
+    build_theme,
+    card_quantity_for_package,
+    claim_profile_codes,
+    client_welcome_email,
+    slug_base,
+)
+
+BULK_ORDER_CHUNK_SIZE = 200
+BULK_ORDER_REQUIRED_COLUMNS = ("full_name", "email", "phone")
+CHUNK_ATTEMPTS = 3
+IMPORT_JOB_TIMEOUT = 60 * 60 * 24
+# A running job that has not reported a chunk for this long died with its
+# worker (a chunk of 200 rows takes well under this even on one core).
+IMPORT_JOB_STALE_AFTER = 60 * 15
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+SLUG_PREFIX_BATCH = 100
+
+
+class BulkOrderError(ValueError):
+    pass
+
+
+def _column(header):
+    return str(header or "").strip().lower().replace(" ", "_")
+
+
+def read_order_rows(handle, name):
+    # Yields (line number, {column: value}) from a binary CSV or XLSX handle.
+    if PurePath(name).suffix.lower() == ".xlsx":
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise BulkOrderError("Reading .xlsx files needs openpyxl (pip install openpyxl).")
+        rows = load_workbook(handle, read_only=True, data_only=True).active.iter_rows(values_only=True)
+    else:
+        rows = csv.reader(io.TextIOWrapper(handle, encoding="utf-8-sig", newline=""))
+    try:
+        header = next(rows, None)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise BulkOrderError(f"Could not read the file: {exc}")
+    if not header:
+        raise BulkOrderError("The file is empty.")
+    columns = [_column(value) for value in header]
+    missing = [column for column in BULK_ORDER_REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise BulkOrderError(f"Missing column(s): {', '.join(missing)}.")
+    try:
+        for number, values in enumerate(rows, start=2):
+            record = {
+                column: "" if value is None else str(value).strip()
+                for column, value in zip(columns, values)
+                if column
+            }
+            if any(record.values()):
+                yield number, record
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise BulkOrderError(f"Could not read the file: {exc}")
+
+
+def validate_rows(records, defaults):
+    valid, errors = [], []
+    seen = {}
+    for number, record in records:
+        data = {**defaults, **{key: value for key, value in record.items() if value}}
+        data.setdefault("shipping_name", data.get("full_name", ""))
+        data.setdefault("shipping_phone", data.get("phone", ""))
+        form = BulkOrderRowForm(data)
+        if not form.is_valid():
+            errors.append(
+                (number, "; ".join(f"{field}: {' '.join(messages)}" for field, messages in form.errors.items()))
+            )
+            continue
+        email = form.cleaned_data["email"].lower()
+        if email in seen:
+            errors.append((number, f"email: same address as row {seen[email]}"))
+            continue
+        seen[email] = number
+        valid.append((number, form.cleaned_data))
+    # One query for the whole file: an address whose portal account already
+    # belongs to a customer cannot be given another one.
+    linked = set(
+        Customer.objects.filter(user__username__in=[data["email"] for _, data in valid]).values_list(
+            "user__username", flat=True
+        )
+    )
+    if linked:
+        errors += [
+            (number, "email: already has a client portal account")
+            for number, data in valid
+            if data["email"] in linked
+        ]
+        valid = [(number, data) for number, data in valid if data["email"] not in linked]
+        errors.sort()
+    return valid, errors
+
+
+def allocate_slugs(names):
+    # Same slugs as services.generate_unique_slug, but with one query for the
+    # bare bases plus one per 100 bases that need a numeric suffix.
+    bases = [slug_base(name) for name in names]
+    taken = set(Profile.objects.filter(slug__in=set(bases)).values_list("slug", flat=True))
+    repeated = {base for base, count in Counter(bases).items() if count > 1}
+    crowded = sorted({base for base in bases if base in taken} | repeated)
+    for start in range(0, len(crowded), SLUG_PREFIX_BATCH):
+        prefixes = Q()
+        for base in crowded[start : start + SLUG_PREFIX_BATCH]:
+            prefixes |= Q(slug__startswith=f"{base}-")
+        taken.update(Profile.objects.filter(prefixes).values_list("slug", flat=True))
+    slugs = []
+    for base in bases:
+        slug, suffix = base, 1
+        while slug in taken:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def hash_passwords(passwords):
+    # PBKDF2 runs in OpenSSL with the GIL released, so threads use every core.
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+_email_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-order-email")
+
+
+def _send_messages(messages):
+    get_connection(fail_silently=True).send_messages(messages)
+
+
+def _split_name(full_name):
+    first, _, last = full_name.partition(" ")
+    return first, last.strip()
+
+
+def _create_chunk(rows, send_email):
+    from .qr import enqueue_prerender_qr  # cards.qr imports cards.services
+
+    User = get_user_model()
+    emails = [data["email"] for _, data in rows]
+    existing = {user.username: user for user in User.objects.filter(username__in=emails)}
+    passwords = {email: secrets.token_urlsafe(8) for email in emails if email not in existing}
+    hashes = dict(zip(passwords, hash_passwords(list(passwords.values()))))
+    now = timezone.now()
+    for attempt in range(CHUNK_ATTEMPTS):
+        slugs = allocate_slugs([data["full_name"] for _, data in rows])
+        try:
+            with transaction.atomic():
+                codes = claim_profile_codes(len(rows))
+                users = User.objects.bulk_create(
+                    [
+                        User(
+                            username=email,
+                            email=email,
+                            password=hashes[email],
+                            first_name=_split_name(data["full_name"])[0],
+                            last_name=_split_name(data["full_name"])[1],
+                        )
+                        for email, (_, data) in zip(emails, rows)
+                        if email in passwords
+                    ]
+                )
+                accounts = {**existing, **{user.username: user for user in users}}
+                customers = Customer.objects.bulk_create(
+                    [
+                        Customer(
+                            user=accounts[data["email"]],
+                            full_name=data["full_name"],
+                            email=data["email"],
+                            phone=data["phone"],
+                            phone_normalized=normalize_phone(data["phone"]),
+                            package=data["package"],
+                            status="active",
+                        )
+                        for _, data in rows
+                    ]
+                )
+                profiles = Profile.objects.bulk_create(
+                    [
+                        Profile(
+                            customer=customer,
+                            code=code,
+                            slug=slug,
+                            template_key=data["template_key"],
+                            theme_json=build_theme({}),
+                            content_json=build_content(
+                                {**data, "whatsapp": data["whatsapp"] or data["phone"], "links": []}
+                            ),
+                            status="live",
+                            hosting_expires_at=now + timedelta(days=365 * HOSTING_INCLUDED_YEARS),
+                        )
+                        for customer, code, slug, (_, data) in zip(customers, codes, slugs, rows)
+                    ]
+                )
+                Order.objects.bulk_create(
+                    [
+                        Order(
+                            customer=customer,
+                            profile=profile,
+                            package=data["package"],
+                            card_quantity=card_quantity_for_package(data["package"]),
+                            shipping_name=data["shipping_name"],
+                            shipping_phone=data["shipping_phone"],
+                            shipping_address=data["shipping_address"],
+                            status="paid",
+                            paid_at=now,
+                        )
+                        for customer, profile, (_, data) in zip(customers, profiles, rows)
+                    ]
+                )
+        except DatabaseError:
+            # Most likely a slug taken since allocation; re-allocate.
+            if attempt == CHUNK_ATTEMPTS - 1:
+                raise
+            continue
+        break
+    for profile in profiles:
+        profile_resolver.register(profile)
+        enqueue_prerender_qr(profile)
+    profile_resolver.register(profiles[-1], publish=True)
+    if send_email:
+        _email_pool.submit(
+            _send_messages,
+            [
+                client_welcome_email(customer, customer.email, passwords[customer.email])
+                for customer in customers
+                if customer.email in passwords
+            ],
+        )
+    return len(customers)
+
+
+def create_orders(valid, send_email=True, chunk_size=BULK_ORDER_CHUNK_SIZE, progress=None):
+    # Each chunk commits on its own; a chunk that still fails after retries is
+    # reported row by row and the import carries on with the next one.
+    report = {"created": 0, "errors": [], "seconds": 0.0}
+    started = time.monotonic()
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start : start + chunk_size]
+        try:
+            report["created"] += _create_chunk(chunk, send_email)
+        except DatabaseError as exc:
+            report["errors"] += [(number, f"not imported: {exc}") for number, _ in chunk]
+        report["seconds"] = time.monotonic() - started
+        if progress:
+            progress(report)
+    report["seconds"] = time.monotonic() - started
+    return report
+
+
+def rows_per_second(report):
+    return report["created"] / report["seconds"] if report["seconds"] else 0.0
+
+
+def _job_key(job_id):
+    return f"bulk-order-import:{job_id}"
+
+
+def background_imports_available():
+    # The status page may be served by any worker, so job state needs a
+    # cache shared between processes; runserver (DEBUG) is a single process.
+    return settings.DEBUG or settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def import_job(job_id):
+    job = cache.get(_job_key(job_id))
+    if job and job["state"] in {"queued", "running"} and time.time() - job.get("updated_at", 0) > IMPORT_JOB_STALE_AFTER:
+        job["state"] = "interrupted"
+    return job
+
+
+def _store_job(job_id, state, total, report):
+    cache.set(
+        _job_key(job_id),
+        {"state": state, "total": total, "updated_at": time.time(), **report},
+        IMPORT_JOB_TIMEOUT,
+    )
+
+
+_import_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-order-import")
+
+
+def start_import(valid, send_email=True):
+    # Ops uploads run here instead of in the request: hashing a password for
+    # every new portal account takes minutes for a 2000-row file. Progress is
+    # kept in the cache under the returned job id. The job lives in this web
+    # worker, so a worker recycled mid-import leaves it "interrupted"; large
+    # files are safer with the import_orders command.
+    job_id = secrets.token_hex(8)
+    total = len(valid)
+    last = {"created": 0, "errors": [], "seconds": 0.0}
+
+    def progress(report):
+        last.update(report, errors=list(report["errors"]))
+        _store_job(job_id, "running", total, last)
+
+    def run():
+        close_old_connections()
+        try:
+            report = create_orders(valid, send_email=send_email, progress=progress)
+            _store_job(job_id, "done", total, report)
+        except Exception as exc:
+            # Chunks reported so far are committed; keep their counts.
+            _store_job(job_id, "failed", total, {**last, "errors": last["errors"] + [(0, str(exc))]})
+        finally:
+            close_old_connections()
+
+    _store_job(job_id, "queued", total, last)
+    _import_pool.submit(run)
+    return job_id
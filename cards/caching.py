@@ -0,0 +1,162 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+# Bump the version whenever the cached entry's keys change, so a shared cache
+# never hands new code an entry written in the old shape.
+PROFILE_PAGE_PREFIX = "profile-page:v2"
+PROFILE_STATS_PREFIX = "profile-stats"
+VISIT_TOKEN_PLACEHOLDER = "__visit_token__"
+
+
+def profile_page_key(lookup, value):
+    return f"{PROFILE_PAGE_PREFIX}:{lookup}:{value}"
+
+
+def profile_content_version(profile):
+    if not profile.updated_at:
+        return 0
+    return int(profile.updated_at.timestamp() * 1_000_000)
+
+
+def get_profile_page(lookup, value):
+    if not settings.PROFILE_PAGE_CACHE_TIMEOUT:
+        return None
+    entry = cache.get(profile_page_key(lookup, value))
+    if not entry:
+        return None
+    if entry["expires_at"] <= timezone.now():
+        return None
+    return entry
+
+
+def set_profile_page(profile, html):
+    entry = {
+        "profile_id": profile.pk,
+        "code": profile.code,
+        "template_key": profile.template_key,
+        "version": profile_content_version(profile),
+        "updated_at": profile.updated_at,
+        "expires_at": profile.hosting_expires_at,
+        "html": html,
+    }
+    timeout = settings.PROFILE_PAGE_CACHE_TIMEOUT
+    if not timeout or not profile.is_active:
+        return entry
+    remaining = int((profile.hosting_expires_at - timezone.now()).total_seconds())
+    timeout = min(timeout, remaining)
+    if timeout <= 0:
+        return entry
+    entries = {profile_page_key("code", profile.code): entry}
+    if profile.slug:
+        entries[profile_page_key("slug", profile.slug)] = entry
+    cache.set_many(entries, timeout)
+    return entry
+
+
+def profile_page_etag(entry):
+    expires = int(entry["expires_at"].timestamp())
+    return f'"{entry["profile_id"]}-{entry["version"]}-{entry["template_key"]}-{expires}"'
+
+
+def _profile_page_keys(code, slug):
+    keys = [profile_page_key("code", code)]
+    if slug:
+        keys.append(profile_page_key("slug", slug))
+    return keys
+
+
+def invalidate_profile_page(profile):
+    cache.delete_many(_profile_page_keys(profile.code, profile.slug))
+
+
+def remember_profile_page_keys(sender, instance, raw=False, **kwargs):
+    # pre_save receiver: a save may change the code or slug, and the page is
+    # still cached under the old ones.
+    if raw or instance._state.adding:
+        return
+    instance._previous_page_keys = _profile_page_keys(
+        *(sender._default_manager.filter(pk=instance.pk).values_list("code", "slug").first() or (None, None))
+    )
+
+
+def invalidate_saved_profile_page(sender, instance, raw=False, **kwargs):
+    # post_save receiver, so dj-admin and every other Profile.save() drop the
+    # cached page; queryset .update() callers still invalidate themselves.
+    if raw:
+        return
+    keys = set(_profile_page_keys(instance.code, instance.slug))
+    keys.update(instance.__dict__.pop("_previous_page_keys", ()))
+    transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+def profile_stats_key(profile_id):
+    return f"{PROFILE_STATS_PREFIX}:{profile_id}"
+
+
+def get_profile_stats(profile_id, compute):
+    key = profile_stats_key(profile_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats, settings.CLIENT_DASHBOARD_CACHE_TIMEOUT)
+    return stats
+
+
+_stats_invalidated = {}
+
+
+def invalidate_profile_stats(profile_ids):
+    # Called once new visits/actions are in the database. A card being tapped
+    # at an event writes constantly, so only the first write per profile in
+    # each TTL window drops the cached stats (tracked per worker, then with a
+    # shared cache.add marker); later writes show up when the TTL runs out.
+    timeout = settings.CLIENT_DASHBOARD_CACHE_TIMEOUT
+    now = time.monotonic()
+    if len(_stats_invalidated) > 10_000:
+        _stats_invalidated.clear()
+    stale = []
+    for profile_id in set(profile_ids):
+        if _stats_invalidated.get(profile_id, 0) > now:
+            continue
+        _stats_invalidated[profile_id] = now + timeout
+        if cache.add(f"{PROFILE_STATS_PREFIX}:dirty:{profile_id}", 1, timeout):
+            stale.append(profile_stats_key(profile_id))
+    if stale:
+        cache.delete_many(stale)
+
+
+def render_with_visit(html, visit_token):
+    return html.replace(VISIT_TOKEN_PLACEHOLDER, visit_token)
+
+
+_revalidate_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-revalidate")
+
+
+def _store(key, compute, timeout, stale_timeout):
+    value = compute()
+    cache.set(key, {"value": value, "fresh_until": time.time() + timeout}, timeout + stale_timeout)
+    return value
+
+
+def _revalidate(key, compute, timeout, stale_timeout):
+    close_old_connections()
+    try:
+        _store(key, compute, timeout, stale_timeout)
+    finally:
+        cache.delete(f"{key}:refreshing")
+
+
+def get_or_revalidate(key, compute, timeout, stale_timeout):
+    # Stale-while-revalidate: a stale entry is served as-is while a single
+    # background refresh (guarded by a cache lock) recomputes it.
+    entry = cache.get(key)
+    if entry is None:
+        return _store(key, compute, timeout, stale_timeout)
+    if entry["fresh_until"] <= time.time() and cache.add(f"{key}:refreshing", 1, 60):
+        _revalidate_pool.submit(_revalidate, key, compute, timeout, stale_timeout)
+    return entry["value"]
@@ -7,5 +7,6 @@ urlpatterns = [
     path("logout/", views_client.ClientLogoutView.as_view(), name="client-logout"),
     path("", views_client.ClientDashboardView.as_view(), name="client-dashboard"),
     path("profile/", views_client.ClientProfileEditView.as_view(), name="client-profile-edit"),
+    path("export/", views_client.ClientExportView.as_view(), name="client-export"),
     path("password/", views_client.ClientPasswordChangeView.as_view(), name="client-password-change"),
 ]
@@ -46,6 +46,9 @@ ORDER_STATUS_CHOICES = [
     ("cancelled", "Cancelled"),
 ]
 
+# Action types emitted by the public profile page.
+ACTION_TYPES = ("call", "whatsapp", "email", "website", "save_contact", "social")
+
 PAYMENT_STATUS_CHOICES = [
     ("pending", "Pending"),
     ("success", "Success"),
@@ -0,0 +1,86 @@
+import logging
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .buffers import WriteBehindBuffer
+from .constants import ACTION_TYPES
+from .models import EventCounter
+
+COUNTER_FLUSH_INTERVAL = 5
+VISITS_COUNTER = "visits"
+ACTIONS_COUNTER = "actions"
+ACTION_TYPE_PREFIX = "actions:"
+logger = logging.getLogger(__name__)
+
+
+def action_counter_name(action_type):
+    # Action types come from the client; unknown ones share a single row.
+    return ACTION_TYPE_PREFIX + (action_type if action_type in ACTION_TYPES else "other")
+
+
+class CounterBuffer(WriteBehindBuffer):
+    # Deltas are summed per worker and applied with one UPDATE per counter
+    # per interval, so hot counters never serialise request threads on a row.
+    flush_interval = COUNTER_FLUSH_INTERVAL
+    thread_name = "event-counters"
+
+    def add(self, names):
+        self._ensure_worker()
+        with self._lock:
+            self._deltas.update(names)
+
+    def _reset(self):
+        self._deltas = Counter()
+
+    def _take(self):
+        deltas, self._deltas = self._deltas, Counter()
+        return deltas
+
+    def _write(self, deltas):
+        failed = Counter()
+        for name, delta in deltas.items():
+            try:
+                apply_delta(name, delta)
+            except Exception:
+                logger.exception("Could not apply %s to counter %s", delta, name)
+                failed[name] = delta
+        return failed
+
+    def _requeue(self, failed):
+        self._deltas.update(failed)
+
+
+def apply_delta(name, delta):
+    if EventCounter.objects.filter(name=name).update(total=F("total") + delta):
+        return
+    try:
+        with transaction.atomic():
+            EventCounter.objects.create(name=name, total=delta)
+    except IntegrityError:
+        EventCounter.objects.filter(name=name).update(total=F("total") + delta)
+
+
+counter_buffer = CounterBuffer()
+
+
+def count_visit():
+    counter_buffer.add([VISITS_COUNTER])
+
+
+def count_actions(action_types):
+    names = [action_counter_name(action_type) for action_type in action_types]
+    counter_buffer.add(names + [ACTIONS_COUNTER] * len(names))
+
+
+def event_totals():
+    counters = dict(EventCounter.objects.values_list("name", "total"))
+    by_type = Counter(
+        {
+            name[len(ACTION_TYPE_PREFIX):]: total
+            for name, total in counters.items()
+            if name.startswith(ACTION_TYPE_PREFIX) and total
+        }
+    )
+    return counters.get(VISITS_COUNTER, 0), counters.get(ACTIONS_COUNTER, 0), by_type
@@ -0,0 +1,119 @@
+import csv
+import json
+import zlib
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import StreamingHttpResponse
+
+from .models import Action, Visit
+from .rollups import day_start
+
+EXPORT_CHUNK_SIZE = 2000
+# Encoded output is handed to the server in blocks of about this many bytes.
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+EXPORT_KINDS = {
+    "visits": (
+        Visit,
+        "visited_at",
+        (
+            "id",
+            "profile_code",
+            "visited_at",
+            "device_type",
+            "referrer",
+            "utm_source",
+            "utm_medium",
+            "utm_campaign",
+            "utm_term",
+            "utm_content",
+            "user_agent",
+        ),
+    ),
+    "actions": (
+        Action,
+        "created_at",
+        ("id", "profile_code", "visit_id", "created_at", "action_type", "action_value"),
+    ),
+}
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+# Referrers, UTM tags, user agents and action values come from public
+# endpoints; a cell starting with one of these would run as a spreadsheet
+# formula when the CSV is opened in Excel.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def export_rows(kind, profile_id=None, start=None, end=None):
+    model, time_field, fields = EXPORT_KINDS[kind]
+    rows = model.objects.all()
+    if profile_id:
+        rows = rows.filter(profile_id=profile_id)
+    if start:
+        rows = rows.filter(**{f"{time_field}__gte": day_start(start)})
+    if end:
+        rows = rows.filter(**{f"{time_field}__lt": day_start(end + timedelta(days=1))})
+    columns = [field for field in fields if field != "profile_code"]
+    return rows.values(*columns, profile_code=F("profile__code")).order_by(time_field, "id")
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _encode(rows, fields, fmt):
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([_csv_cell(row[field]) for field in fields])
+    else:
+        for row in rows:
+            yield json.dumps({field: row[field] for field in fields}, cls=DjangoJSONEncoder) + "\n"
+
+
+def _blocks(lines, compress):
+    # Lines are joined into ~64KB blocks (and optionally gzipped as they go),
+    # so only one block and one fetch chunk are ever held in memory.
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    block, size = [], 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= EXPORT_BLOCK_SIZE:
+            data = "".join(block).encode("utf-8")
+            block, size = [], 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = "".join(block).encode("utf-8")
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export_response(kind, fmt, filename, compress=False, **filters):
+    _, _, fields = EXPORT_KINDS[kind]
+    content_type, extension = EXPORT_FORMATS[fmt]
+    # iterator() reads through a server-side cursor on Postgres.
+    rows = export_rows(kind, **filters).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    filename = f"{filename}.{extension}"
+    if compress:
+        content_type = "application/gzip"
+        filename += ".gz"
+    response = StreamingHttpResponse(_blocks(_encode(rows, fields, fmt), compress), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
@@ -1,10 +1,15 @@
-import json
+﻿import json
 
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm
+from django.db import transaction
 
+from .caching import invalidate_profile_page
 from .constants import PACKAGE_CHOICES, PROFILE_STATUS_CHOICES, TEMPLATE_CHOICES
+from .exports import EXPORT_FORMATS, EXPORT_KINDS
+from .images import enqueue_logo_processing
+from .models import Profile
 from .services import build_content, build_theme
 
 
@@ -48,6 +53,30 @@ def _parse_json_list(raw):
     return value if isinstance(value, list) else []
 
 
+class LogoUploadMixin:
+    # The fields the edit forms change. Saving only these keeps a concurrent
+    # record_edit's F() bump of edits_used from being overwritten by the
+    # value this instance was loaded with.
+    profile_fields = ("template_key", "status", "theme_json", "content_json", "logo", "logo_variants", "updated_at")
+
+    def _save_profile(self):
+        self.profile.save(update_fields=self.profile_fields)
+
+    def _replace_logo(self, logo):
+        if not logo:
+            return None
+        stale_variants = self.profile.logo_variants
+        self.profile.logo = logo
+        self.profile.logo_variants = {}
+        return stale_variants
+
+    def _process_logo(self, logo, stale_variants):
+        if not logo:
+            return
+        profile_id = self.profile.pk
+        transaction.on_commit(lambda: enqueue_logo_processing(profile_id, stale_variants))
+
+
 class AdminLoginForm(AuthenticationForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -165,7 +194,42 @@ class OrderCreateForm(forms.Form):
         }
 
 
-class ProfileEditForm(forms.Form):
+class BulkOrderRowForm(forms.Form):
+    # One row of a corporate import; blank cells fall back to the import's
+    # defaults (see cards.bulk_orders).
+    full_name = forms.CharField(max_length=120)
+    email = forms.EmailField(max_length=150)
+    phone = forms.CharField(max_length=30)
+    package = forms.ChoiceField(choices=PACKAGE_CHOICES)
+    template_key = forms.ChoiceField(choices=TEMPLATE_CHOICES)
+    title = forms.CharField(max_length=120, required=False)
+    company = forms.CharField(max_length=120, required=False)
+    whatsapp = forms.CharField(max_length=30, required=False)
+    website = forms.CharField(max_length=200, required=False)
+    bio = forms.CharField(required=False)
+    shipping_name = forms.CharField(max_length=120)
+    shipping_phone = forms.CharField(max_length=30)
+    shipping_address = forms.CharField()
+
+
+class BulkOrderUploadForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with a header row.")
+    package = forms.ChoiceField(choices=PACKAGE_CHOICES)
+    template_key = forms.ChoiceField(choices=TEMPLATE_CHOICES)
+    shipping_name = forms.CharField(max_length=120, required=False)
+    shipping_phone = forms.CharField(max_length=30, required=False)
+    shipping_address = forms.CharField(required=False, widget=forms.Textarea(attrs={"rows": 3}))
+    send_email = forms.BooleanField(required=False, initial=True)
+    skip_invalid = forms.BooleanField(required=False)
+    dry_run = forms.BooleanField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            _apply_bootstrap(field)
+
+
+class ProfileEditForm(LogoUploadMixin, forms.Form):
     template_key = forms.ChoiceField(choices=TEMPLATE_CHOICES)
     status = forms.ChoiceField(choices=PROFILE_STATUS_CHOICES)
     mode = forms.ChoiceField(choices=[("light", "Light"), ("dark", "Dark")])
@@ -263,9 +327,9 @@ class ProfileEditForm(forms.Form):
                 "links": self._parse_links(data.get("links_text")),
             }
         )
-        if logo:
-            self.profile.logo = logo
-        self.profile.save()
+        stale_variants = self._replace_logo(logo)
+        self._save_profile()
+        self._process_logo(logo, stale_variants)
         return self.profile
 
 
@@ -288,6 +352,39 @@ class OrderStatusForm(forms.Form):
             _apply_bootstrap(field)
 
 
+class EventExportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[(kind, kind.capitalize()) for kind in EXPORT_KINDS])
+    format = forms.ChoiceField(choices=[(fmt, fmt.upper()) for fmt in EXPORT_FORMATS], initial="csv")
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    gzip = forms.BooleanField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            _apply_bootstrap(field)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and start > end:
+            raise forms.ValidationError("The start date must be on or before the end date.")
+        return cleaned_data
+
+
+class OpsEventExportForm(EventExportForm):
+    profile = forms.CharField(required=False, max_length=20, help_text="Profile code; blank for all profiles.")
+
+    def clean_profile(self):
+        code = self.cleaned_data["profile"].strip().upper()
+        if not code:
+            return None
+        profile_id = Profile.objects.filter(code=code).values_list("pk", flat=True).first()
+        if profile_id is None:
+            raise forms.ValidationError("No profile with this code.")
+        return profile_id
+
+
 class ClientPasswordChangeForm(PasswordChangeForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -295,7 +392,10 @@ class ClientPasswordChangeForm(PasswordChangeForm):
             _apply_bootstrap(field)
 
 
-class ClientProfileForm(forms.Form):
+class ClientProfileForm(LogoUploadMixin, forms.Form):
+    # Clients cannot change the status; leave a concurrent suspension alone.
+    profile_fields = ("template_key", "theme_json", "content_json", "logo", "logo_variants", "updated_at")
+
     logo = forms.ImageField(required=False)
     full_name = forms.CharField(max_length=120)
     title = forms.CharField(max_length=120, required=False)
@@ -521,9 +621,9 @@ class ClientProfileForm(forms.Form):
         )
         self.profile.theme_json = theme
         logo = data.get("logo")
-        if logo:
-            self.profile.logo = logo
-        self.profile.save()
+        stale_variants = self._replace_logo(logo)
+        self._save_profile()
+        self._process_logo(logo, stale_variants)
 
         customer = self.profile.customer
         customer.full_name = data.get("full_name") or customer.full_name
@@ -539,4 +639,6 @@ class ClientProfileForm(forms.Form):
             user.email = data.get("email")
             user.save()
 
+        # The page also shows customer fields, which the Profile save did not cover.
+        invalidate_profile_page(self.profile)
         return self.profile
@@ -0,0 +1,117 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .caching import invalidate_profile_page
+from .models import Profile
+
+# name -> (widths, square crop)
+LOGO_RENDITIONS = {
+    "avatar": ((96, 192), True),
+    "header": ((480, 960), False),
+}
+LOGO_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+LOGO_QUALITY = 80
+logger = logging.getLogger(__name__)
+
+
+def _load_logo(profile):
+    with profile.logo.open("rb") as handle:
+        image = Image.open(handle)
+        # Applies the EXIF orientation; the renditions are saved without EXIF.
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image
+
+
+def _resize(image, width, square):
+    if square:
+        return ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS)
+    if image.width <= width:
+        return image.copy()
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def _encode(image, fmt):
+    if fmt == "jpeg" and image.mode == "RGBA":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=LOGO_FORMATS[fmt], quality=LOGO_QUALITY, optimize=fmt == "jpeg")
+    return buffer.getvalue()
+
+
+def delete_logo_variants(variants):
+    for formats in (variants or {}).values():
+        for widths in formats.values():
+            for name in widths.values():
+                default_storage.delete(name)
+
+
+def build_logo_variants(profile):
+    image = _load_logo(profile)
+    stem = PurePosixPath(profile.logo.name).stem
+    variants = {}
+    try:
+        for rendition, (widths, square) in LOGO_RENDITIONS.items():
+            variants[rendition] = {fmt: {} for fmt in LOGO_FORMATS}
+            for width in widths:
+                resized = _resize(image, width, square)
+                for fmt in LOGO_FORMATS:
+                    path = f"logos/variants/{profile.pk}/{stem}-{rendition}-{width}.{fmt}"
+                    name = default_storage.save(path, ContentFile(_encode(resized, fmt)))
+                    variants[rendition][fmt][str(width)] = name
+    except Exception:
+        # Don't leave the files written so far orphaned in storage.
+        delete_logo_variants(variants)
+        raise
+    return variants
+
+
+def process_logo(profile_id, stale_variants=None):
+    # Runs in the logo pool, where an exception would vanish with its future.
+    close_old_connections()
+    variants = None
+    try:
+        profile = Profile.objects.filter(pk=profile_id).first()
+        if not profile or not profile.logo:
+            return
+        logo_name = profile.logo.name
+        variants = build_logo_variants(profile)
+        updated = Profile.objects.filter(pk=profile_id, logo=logo_name).update(
+            logo_variants=variants, updated_at=timezone.now()
+        )
+    except Exception:
+        logger.exception("Could not build logo variants for profile %s", profile_id)
+        if variants:
+            delete_logo_variants(variants)
+        return
+    try:
+        delete_logo_variants(stale_variants)
+        if not updated:
+            # A newer upload won the race; its own job will write the variants.
+            delete_logo_variants(variants)
+            return
+        delete_logo_variants(profile.logo_variants)
+        invalidate_profile_page(profile)
+    except Exception:
+        # The new variants are saved; only cleanup of old files failed.
+        logger.exception("Could not clean up old logo variants for profile %s", profile_id)
+
+
+_logo_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="logo-variants")
+
+
+def enqueue_logo_processing(profile_id, stale_variants=None):
+    _logo_pool.submit(process_logo, profile_id, stale_variants)
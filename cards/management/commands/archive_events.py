@@ -0,0 +1,113 @@
+﻿import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+
+from cards.partitions import (
+    PARTITIONED_EVENTS,
+    add_months,
+    drop_partition,
+    ensure_event_partitions,
+    is_partitioned,
+    month_bounds,
+    partition_months,
+)
+from cards.rollups import EVENTS_ARCHIVED, first_event_day, rollup_range, set_watermark, watermark
+
+DELETE_BATCH_SIZE = 10_000
+
+
+def _export(model, column, month, archive_dir):
+    start, end = month_bounds(month)
+    path = Path(archive_dir) / model._meta.db_table / f"{month:%Y-%m}.ndjson.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    rows = model.objects.filter(**{f"{column}__gte": start, f"{column}__lt": end}).values()
+    count = 0
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as handle:
+        for row in rows.iterator(chunk_size=2000):
+            handle.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+            count += 1
+    if count:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink()
+    return count
+
+
+def _delete_range(model, column, month):
+    # Plain DELETEs by primary key batch: QuerySet.delete() would load every
+    # row to run the Action.visit SET_NULL cascade in Python. Actions have no
+    # database constraint on their visit, so leaving their visit_id as-is
+    # matches what dropping a partition does.
+    start, end = month_bounds(month)
+    rows = model.objects.filter(**{f"{column}__gte": start, f"{column}__lt": end})
+    using = router.db_for_write(model)
+    deleted = 0
+    while True:
+        batch = list(rows.values_list("pk", flat=True)[:DELETE_BATCH_SIZE])
+        if not batch:
+            return deleted
+        deleted += model.objects.filter(pk__in=batch)._raw_delete(using)
+
+
+class Command(BaseCommand):
+    help = "Roll up, export and drop raw visits and actions older than the retention window"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-months", type=int, default=settings.EVENT_RETENTION_MONTHS)
+        parser.add_argument("--archive-dir", default=settings.EVENT_ARCHIVE_DIR)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def _expired_months(self, cutoff, partitioned):
+        if partitioned:
+            months = set()
+            for model, _ in PARTITIONED_EVENTS:
+                months.update(month for month in partition_months(model._meta.db_table) if month < cutoff)
+            return sorted(months)
+        first = first_event_day()
+        months = []
+        month = first.replace(day=1) if first else cutoff
+        while month < cutoff:
+            months.append(month)
+            month = add_months(month, 1)
+        return months
+
+    def handle(self, *args, **options):
+        this_month = datetime.now(dt_timezone.utc).date().replace(day=1)
+        cutoff = add_months(this_month, -max(options["keep_months"], 1))
+        partitioned = all(is_partitioned(model._meta.db_table) for model, _ in PARTITIONED_EVENTS)
+        if partitioned and not options["dry_run"]:
+            # Also moves rows stranded in the default partition into their
+            # month, so they are listed and archived below.
+            for table, created in ensure_event_partitions(this_month).items():
+                if created:
+                    self.stdout.write(f"Created {len(created)} partition(s) for {table}.")
+
+        for month in self._expired_months(cutoff, partitioned):
+            last_day = add_months(month, 1) - timedelta(days=1)
+            if options["dry_run"]:
+                self.stdout.write(f"Would archive {month:%Y-%m}.")
+                continue
+            # Compact first, so the analytics tables still cover the month.
+            rollup_range(month, last_day)
+            exported = {
+                model._meta.db_table: _export(model, column, month, options["archive_dir"])
+                for model, column in PARTITIONED_EVENTS
+            }
+            archived = watermark(EVENTS_ARCHIVED)
+            if not archived or archived < last_day:
+                set_watermark(EVENTS_ARCHIVED, last_day)
+            for model, column in reversed(PARTITIONED_EVENTS):
+                if partitioned:
+                    drop_partition(model._meta.db_table, month)
+                else:
+                    _delete_range(model, column, month)
+            summary = ", ".join(f"{count} {table}" for table, count in exported.items())
+            self.stdout.write(self.style.SUCCESS(f"Archived {month:%Y-%m}: {summary}."))
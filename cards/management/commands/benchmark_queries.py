@@ -0,0 +1,243 @@
+﻿import json
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from cards.constants import ACTION_TYPES
+from cards.models import Action, Customer, DailyVisitStat, Order, Profile, Visit
+from cards.phones import normalize_phone, phone_search_digits
+from cards.rollups import day_start
+from cards.search import SEARCH_LIMIT, customer_search, profile_search
+
+SEED_BATCH_SIZE = 5000
+ORDER_STATUSES = (("completed", 70), ("shipped", 20), ("encoded", 5), ("paid", 4), ("cancelled", 1))
+
+
+class Rollback(Exception):
+    pass
+
+
+def hot_queries(profile_id, now):
+    today = day_start(timezone.localdate())
+    last_7 = now - timedelta(days=7)
+    # name -> (queryset, tables that must not be read with a sequential scan)
+    return {
+        "dashboard.paid_orders": (Order.objects.filter(status="paid").values("pk"), ["cards_order"]),
+        "dashboard.encoded_orders": (Order.objects.filter(status="encoded").values("pk"), ["cards_order"]),
+        "dashboard.live_profiles": (
+            Profile.objects.filter(status="live", hosting_expires_at__gte=now).values("pk"),
+            ["cards_profile"],
+        ),
+        "dashboard.renewals_30d": (
+            Profile.objects.filter(
+                hosting_expires_at__lte=now + timedelta(days=30), hosting_expires_at__gte=now
+            ).values("pk"),
+            ["cards_profile"],
+        ),
+        "dashboard.visits_last_7d": (Visit.objects.filter(visited_at__gte=last_7).values("pk"), ["cards_visit"]),
+        "dashboard.actions_last_7d": (
+            Action.objects.filter(created_at__gte=last_7).values("pk"),
+            ["cards_action"],
+        ),
+        "renewals.expiring_7": (
+            Profile.objects.filter(
+                hosting_expires_at__lte=now + timedelta(days=7), hosting_expires_at__gte=now
+            ).select_related("customer"),
+            ["cards_profile"],
+        ),
+        "suspend_expired.live_expired": (
+            Profile.objects.filter(hosting_expires_at__lt=now, status="live").values("pk"),
+            ["cards_profile"],
+        ),
+        "analytics.profile_visits_today": (
+            Visit.objects.filter(profile_id=profile_id, visited_at__gte=today)
+            .annotate(bucket=TruncDate("visited_at"))
+            .values("bucket")
+            .annotate(total=Count("id")),
+            ["cards_visit"],
+        ),
+        "analytics.profile_actions_today": (
+            Action.objects.filter(profile_id=profile_id, created_at__gte=today)
+            .values("action_type")
+            .annotate(total=Count("id")),
+            ["cards_action"],
+        ),
+        "analytics.actions_today_by_type": (
+            Action.objects.filter(created_at__gte=today).values("action_type").annotate(total=Count("id")),
+            ["cards_action"],
+        ),
+        "analytics.profile_visit_rollup": (
+            DailyVisitStat.objects.filter(profile_id=profile_id).values("day").annotate(total=Sum("total")),
+            ["cards_dailyvisitstat"],
+        ),
+        "ops.customers_page": (
+            Customer.objects.filter(status="active").order_by("-created_at", "-pk")[:51],
+            ["cards_customer"],
+        ),
+        "ops.profiles_page": (Profile.objects.order_by("-created_at", "-pk")[:51], ["cards_profile"]),
+        "ops.orders_page": (
+            Order.objects.filter(package="basic").order_by("-created_at", "-pk")[:51],
+            ["cards_order"],
+        ),
+        "ops.search_customer_name": (customer_search("customer 4217")[:SEARCH_LIMIT], ["cards_customer"]),
+        "ops.search_customer_phone": (
+            customer_search("0500004217", phone_search_digits("0500004217"))[:SEARCH_LIMIT],
+            ["cards_customer"],
+        ),
+        "ops.search_profile_code": (profile_search("BENCH0004217")[:SEARCH_LIMIT], ["cards_profile"]),
+    }
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _table_of(relation):
+    # Partitions are named <table>_pYYYYMM / <table>_default.
+    if relation.endswith("_default"):
+        return relation[: -len("_default")]
+    head, _, tail = relation.rpartition("_p")
+    if head and tail.isdigit():
+        return head
+    return relation
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic traffic and EXPLAIN (ANALYZE, BUFFERS) the hot ops/client queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=5000)
+        parser.add_argument("--visits", type=int, default=500000)
+        parser.add_argument("--actions", type=int, default=100000)
+        parser.add_argument("--days", type=int, default=365, help="Spread of the seeded traffic")
+        parser.add_argument("--keep", action="store_true", help="Commit the seeded rows instead of rolling back")
+        parser.add_argument("--no-seed", action="store_true", help="Explain against the existing data")
+
+    def _seed(self, options, now):
+        rng = random.Random(1)
+        customers = Customer.objects.bulk_create(
+            [
+                Customer(
+                    full_name=f"Bench Customer {index}",
+                    email=f"bench{index}@example.com",
+                    phone=f"+2335{index:08d}",
+                    phone_normalized=normalize_phone(f"+2335{index:08d}"),
+                    package="basic",
+                )
+                for index in range(options["profiles"])
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        profiles = Profile.objects.bulk_create(
+            [
+                Profile(
+                    customer=customer,
+                    code=f"BENCH{index:07d}",
+                    status="live" if rng.random() < 0.85 else rng.choice(["draft", "suspended"]),
+                    hosting_expires_at=now + timedelta(days=rng.randint(-180, 730)),
+                )
+                for index, customer in enumerate(customers)
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        statuses, weights = zip(*ORDER_STATUSES)
+        Order.objects.bulk_create(
+            [
+                Order(
+                    customer_id=profile.customer_id,
+                    profile=profile,
+                    package="basic",
+                    shipping_name="Bench",
+                    shipping_phone="+233500000000",
+                    shipping_address="Accra",
+                    status=rng.choices(statuses, weights)[0],
+                )
+                for profile in profiles
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        # A few cards get most of the taps, as at real events.
+        profile_ids = [profile.pk for profile in profiles]
+        popularity = [1 / (rank + 1) for rank in range(len(profile_ids))]
+        seconds = options["days"] * 86400
+        for model, total, build in (
+            (
+                Visit,
+                options["visits"],
+                lambda profile_id: Visit(
+                    profile_id=profile_id,
+                    visited_at=now - timedelta(seconds=rng.randrange(seconds)),
+                    ip_hash="bench",
+                    device_type=rng.choice(["mobile", "mobile", "desktop", "tablet"]),
+                ),
+            ),
+            (
+                Action,
+                options["actions"],
+                lambda profile_id: Action(profile_id=profile_id, action_type=rng.choice(ACTION_TYPES)),
+            ),
+        ):
+            for offset in range(0, total, SEED_BATCH_SIZE):
+                size = min(SEED_BATCH_SIZE, total - offset)
+                owners = rng.choices(profile_ids, popularity, k=size)
+                model.objects.bulk_create([build(profile_id) for profile_id in owners])
+        # created_at is auto_now_add, so spread the seeded actions afterwards.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE cards_action SET created_at = %s - random() * %s * interval '1 second' "
+                "WHERE profile_id = ANY(%s)",
+                [now, seconds, profile_ids],
+            )
+            cursor.execute("ANALYZE")
+        return profile_ids[0]
+
+    def _explain(self, queryset):
+        plan = json.loads(queryset.explain(format="json", analyze=True, buffers=True))
+        return plan[0] if isinstance(plan, list) else plan
+
+    def _run(self, options):
+        now = timezone.now()
+        if options["no_seed"]:
+            profile_id = Visit.objects.values_list("profile_id", flat=True).first()
+        else:
+            self.stdout.write("Seeding benchmark data...")
+            profile_id = self._seed(options, now)
+        failures = []
+        for name, (queryset, tables) in hot_queries(profile_id, now).items():
+            result = self._explain(queryset)
+            plan = result["Plan"]
+            scans = [
+                node["Relation Name"]
+                for node in _plan_nodes(plan)
+                if node["Node Type"] == "Seq Scan" and _table_of(node["Relation Name"]) in tables
+            ]
+            buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+            line = f"{name}: {result['Execution Time']:.2f} ms, {buffers} buffers, {plan['Node Type']}"
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"{line} (seq scan on {', '.join(sorted(set(scans)))})"))
+            else:
+                self.stdout.write(line)
+        return failures
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("benchmark_queries needs PostgreSQL (EXPLAIN ANALYZE, BUFFERS).")
+        failures = []
+        try:
+            with transaction.atomic():
+                failures = self._run(options)
+                if not options["keep"]:
+                    raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError(f"Sequential scan on hot queries: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("No hot query uses a sequential scan."))
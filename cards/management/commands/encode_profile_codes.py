@@ -0,0 +1,40 @@
+﻿import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from cards.models import ProfileCode
+
+
+class Command(BaseCommand):
+    help = "Reserve the next unclaimed codes for an NFC encoding batch and print them as CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("count", type=int)
+        parser.add_argument("--batch", required=True, help="Label written on the encoded tag batch")
+
+    def handle(self, *args, **options):
+        if options["count"] < 1:
+            raise CommandError("count must be at least 1.")
+        # Claims take codes oldest first, so the batch is the head of the
+        # queue: these tags are the next ones handed to new profiles.
+        with transaction.atomic():
+            rows = list(
+                ProfileCode.objects.select_for_update(skip_locked=True)
+                .filter(claimed_at__isnull=True, encoded_at__isnull=True)
+                .order_by("id")
+                .values_list("id", "code")[: options["count"]]
+            )
+            ProfileCode.objects.filter(id__in=[row_id for row_id, _ in rows]).update(
+                batch=options["batch"], encoded_at=timezone.now()
+            )
+        if len(rows) < options["count"]:
+            self.stderr.write(
+                f"Only {len(rows)} unencoded code(s) in stock; run mint_profile_codes to add more."
+            )
+        writer = csv.writer(self.stdout)
+        writer.writerow(["code", "url"])
+        for _, code in rows:
+            writer.writerow([code, f"{settings.SITE_URL}/c/{code}"])
@@ -0,0 +1,71 @@
+﻿from django.core.management.base import BaseCommand, CommandError
+
+from cards.bulk_orders import (
+    BULK_ORDER_CHUNK_SIZE,
+    BulkOrderError,
+    create_orders,
+    read_order_rows,
+    rows_per_second,
+    validate_rows,
+)
+from cards.constants import PACKAGES, TEMPLATE_PRESETS
+
+
+class Command(BaseCommand):
+    help = "Import a corporate order file (CSV/XLSX): one customer, profile and order per row"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or XLSX file with a header row")
+        parser.add_argument("--package", choices=list(PACKAGES), default="basic", help="Default package")
+        parser.add_argument("--template", choices=list(TEMPLATE_PRESETS), default="business", help="Default template")
+        parser.add_argument("--shipping-name", default="", help="Default recipient (else each row's name)")
+        parser.add_argument("--shipping-phone", default="", help="Default recipient phone (else each row's phone)")
+        parser.add_argument("--shipping-address", default="", help="Default delivery address")
+        parser.add_argument("--chunk-size", type=int, default=BULK_ORDER_CHUNK_SIZE)
+        parser.add_argument("--no-email", action="store_true", help="Do not send welcome emails")
+        parser.add_argument("--skip-invalid", action="store_true", help="Import the valid rows even if some fail")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only")
+
+    def _write_errors(self, errors):
+        for number, message in errors:
+            self.stderr.write(f"Row {number}: {message}")
+
+    def handle(self, *args, **options):
+        defaults = {
+            "package": options["package"],
+            "template_key": options["template"],
+            "shipping_name": options["shipping_name"],
+            "shipping_phone": options["shipping_phone"],
+            "shipping_address": options["shipping_address"],
+        }
+        defaults = {key: value for key, value in defaults.items() if value}
+        try:
+            with open(options["path"], "rb") as handle:
+                valid, errors = validate_rows(read_order_rows(handle, options["path"]), defaults)
+        except (OSError, BulkOrderError) as exc:
+            raise CommandError(str(exc))
+        self._write_errors(errors)
+        self.stdout.write(f"{len(valid)} valid row(s), {len(errors)} invalid.")
+        if options["dry_run"]:
+            return
+        if errors and not options["skip_invalid"]:
+            raise CommandError("Nothing imported; fix the rows above or pass --skip-invalid.")
+
+        def progress(report):
+            self.stdout.write(
+                f"  {report['created']}/{len(valid)} created ({rows_per_second(report):.1f} rows/s)"
+            )
+
+        report = create_orders(
+            valid,
+            send_email=not options["no_email"],
+            chunk_size=max(options["chunk_size"], 1),
+            progress=progress,
+        )
+        self._write_errors(report["errors"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']} order(s) in {report['seconds']:.1f}s "
+                f"({rows_per_second(report):.1f} rows/s); {len(report['errors'])} row(s) failed."
+            )
+        )
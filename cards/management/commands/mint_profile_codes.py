@@ -0,0 +1,26 @@
+﻿from django.core.management.base import BaseCommand, CommandError
+
+from cards.models import ProfileCode
+from cards.services import mint_profile_codes
+
+
+class Command(BaseCommand):
+    help = "Add unclaimed codes to the profile code inventory"
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument("--count", type=int, help="Mint this many new codes")
+        target.add_argument("--ensure-free", type=int, help="Top the unclaimed stock up to this many codes")
+
+    def handle(self, *args, **options):
+        if (options["count"] or 0) < 0 or (options["ensure_free"] or 0) < 0:
+            raise CommandError("Counts must not be negative.")
+        free = ProfileCode.objects.filter(claimed_at__isnull=True).count()
+        count = options["count"] if options["count"] is not None else options["ensure_free"] - free
+        if count <= 0:
+            self.stdout.write(f"{free} unclaimed code(s) in stock; nothing to mint.")
+            return
+        minted = mint_profile_codes(count)
+        self.stdout.write(
+            self.style.SUCCESS(f"Minted {len(minted)} code(s); {free + len(minted)} unclaimed in stock.")
+        )
@@ -0,0 +1,65 @@
+﻿import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cards.models import Profile
+from cards.qr import QR_PRERENDER_VARIANTS, profile_qr_payloads, qr_cache_key, qr_cache_path, render_qr_file
+
+
+class Command(BaseCommand):
+    help = "Pre-render QR images for all live profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--base-url",
+            default=settings.SITE_URL,
+            help="Origin encoded in the profile URL QR (defaults to SITE_URL)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        base_url = options["base_url"]
+        cache_dir = settings.QR_CACHE_DIR
+        profiles = (
+            Profile.objects.filter(status="live", hosting_expires_at__gte=timezone.now())
+            .only("id", "code", "content_json")
+            .iterator(chunk_size=chunk_size)
+        )
+
+        started = time.monotonic()
+        total = 0
+        rendered = 0
+        skipped = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                batch = list(islice(profiles, chunk_size))
+                if not batch:
+                    break
+                total += len(batch)
+                payloads = [data for profile in batch for data in profile_qr_payloads(profile, base_url)]
+                for options in QR_PRERENDER_VARIANTS:
+                    pending = [
+                        data
+                        for data in payloads
+                        if not qr_cache_path(qr_cache_key(data, options), options, cache_dir).exists()
+                    ]
+                    skipped += len(payloads) - len(pending)
+                    rendered += sum(
+                        pool.map(render_qr_file, pending, repeat(cache_dir), repeat(options), chunksize=32)
+                    )
+
+        elapsed = time.monotonic() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {rendered} QR image(s) for {total} profile(s), skipped {skipped} unchanged "
+                f"in {elapsed:.1f}s ({rate:.0f} images/s)."
+            )
+        )
@@ -0,0 +1,15 @@
+﻿from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cards.qr import prune_qr_cache
+
+
+class Command(BaseCommand):
+    help = "Delete cached QR images that have not been written for a while"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.QR_CACHE_MAX_AGE_DAYS)
+
+    def handle(self, *args, **options):
+        removed = prune_qr_cache(max(options["days"], 1))
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} cached QR image(s)."))
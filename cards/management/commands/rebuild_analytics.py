@@ -0,0 +1,131 @@
+﻿import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from cards.models import Profile
+from cards.rollups import first_event_day, rolled_up_through, rollup_range, set_rolled_up_through
+
+
+def _rebuild_partition(first_day, last_day, profile_ids):
+    close_old_connections()
+    return rollup_range(date.fromisoformat(first_day), date.fromisoformat(last_day), profile_ids)
+
+
+def _parse_day(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise CommandError(f"{name} must be a YYYY-MM-DD date.") from exc
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily analytics tables from raw visits and actions in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="First day to rebuild (defaults to the first event)")
+        parser.add_argument("--until", help="Last day to rebuild (defaults to yesterday)")
+        parser.add_argument("--window-days", type=int, default=7)
+        parser.add_argument("--profiles-per-partition", type=int, default=5000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--checkpoint",
+            default=str(settings.BASE_DIR / "var" / "rebuild_analytics.json"),
+            help="File recording finished partitions so an interrupted run can resume",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+
+    def _partitions(self, first_day, last_day, window_days, profiles_per_partition):
+        bounds = Profile.objects.aggregate(low=Min("id"), high=Max("id"))
+        if bounds["low"] is None:
+            return []
+        windows = []
+        day = first_day
+        while day <= last_day:
+            end = min(day + timedelta(days=window_days - 1), last_day)
+            windows.append((day.isoformat(), end.isoformat()))
+            day = end + timedelta(days=1)
+        return [
+            (window_start, window_end, (low, min(low + profiles_per_partition - 1, bounds["high"])))
+            for window_start, window_end in windows
+            for low in range(bounds["low"], bounds["high"] + 1, profiles_per_partition)
+        ]
+
+    def _load_checkpoint(self, path, plan):
+        if not path.exists():
+            return set()
+        state = json.loads(path.read_text(encoding="utf-8"))
+        if state.get("plan") != plan:
+            raise CommandError(f"{path} belongs to a different rebuild; pass --restart to discard it.")
+        return {tuple(key) for key in state["done"]}
+
+    def _save_checkpoint(self, path, plan, done):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"plan": plan, "done": sorted(done)}), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        window_days = max(options["window_days"], 1)
+        profiles_per_partition = max(options["profiles_per_partition"], 1)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        first_day = _parse_day(options["since"], "--since") if options.get("since") else first_event_day()
+        last_day = _parse_day(options["until"], "--until") if options.get("until") else yesterday
+        if first_day is None or first_day > last_day:
+            self.stdout.write("Nothing to rebuild.")
+            return
+
+        plan = {
+            "since": first_day.isoformat(),
+            "until": last_day.isoformat(),
+            "window_days": window_days,
+            "profiles_per_partition": profiles_per_partition,
+        }
+        checkpoint = Path(options["checkpoint"])
+        if options["restart"] and checkpoint.exists():
+            checkpoint.unlink()
+        done = self._load_checkpoint(checkpoint, plan)
+        partitions = self._partitions(first_day, last_day, window_days, profiles_per_partition)
+        pending = [
+            partition
+            for partition in partitions
+            if (partition[0], partition[2][0]) not in done
+        ]
+
+        started = time.monotonic()
+        visit_rows = action_rows = 0
+        # Workers are forked; they must open their own connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {pool.submit(_rebuild_partition, *partition): partition for partition in pending}
+            for future in as_completed(futures):
+                visits, actions = future.result()
+                visit_rows += visits
+                action_rows += actions
+                window_start, _, profile_ids = futures[future]
+                done.add((window_start, profile_ids[0]))
+                self._save_checkpoint(checkpoint, plan, done)
+
+        through = rolled_up_through()
+        if last_day <= yesterday and (
+            (through is None and first_day <= (first_event_day() or first_day))
+            or (through is not None and first_day <= through + timedelta(days=1) <= last_day)
+        ):
+            set_rolled_up_through(last_day)
+        checkpoint.unlink(missing_ok=True)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(pending)} of {len(partitions)} partition(s) from {first_day} to {last_day}: "
+                f"{visit_rows} visit row(s), {action_rows} action row(s) in {elapsed:.1f}s."
+            )
+        )
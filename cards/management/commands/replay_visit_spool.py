@@ -0,0 +1,40 @@
+﻿import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cards.visits import replay_spool
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Command(BaseCommand):
+    help = "Replay visits spooled to disk while the database was unavailable"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Also replay spool files of workers that are still running",
+        )
+
+    def handle(self, *args, **options):
+        replay_all = options.get("all", False)
+        visits = 0
+        files = 0
+        for path in sorted(Path(settings.VISIT_SPOOL_DIR).glob("visits-*.ndjson")):
+            pid = path.stem.split("-", 1)[1]
+            if not replay_all and pid.isdigit() and _is_running(int(pid)):
+                continue
+            visits += replay_spool(path)
+            files += 1
+        self.stdout.write(self.style.SUCCESS(f"Replayed {visits} visit(s) from {files} spool file(s)."))
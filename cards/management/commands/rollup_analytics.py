@@ -0,0 +1,55 @@
+﻿from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cards.partitions import ensure_event_partitions
+from cards.rollups import first_event_day, rolled_up_through, rollup_day, set_rolled_up_through
+
+
+class Command(BaseCommand):
+    help = "Roll completed days of visits and actions into the daily analytics tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=2,
+            help="Completed days to recompute behind the watermark, to pick up late visits",
+        )
+        parser.add_argument("--since", help="Recompute every day from this date (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        # This runs often, so it also keeps the monthly event partitions ahead
+        # of time; archive_events alone is run too rarely to rely on.
+        for table, created in ensure_event_partitions(timezone.now().date()).items():
+            if created:
+                self.stdout.write(f"Created {len(created)} partition(s) for {table}.")
+        yesterday = timezone.localdate() - timedelta(days=1)
+        if options.get("since"):
+            try:
+                start = date.fromisoformat(options["since"])
+            except ValueError as exc:
+                raise CommandError("--since must be a YYYY-MM-DD date.") from exc
+        else:
+            through = rolled_up_through()
+            start = first_event_day() if through is None else min(through + timedelta(days=1), yesterday)
+            if start is None:
+                self.stdout.write("No visits or actions to roll up.")
+                return
+            if through is not None:
+                start -= timedelta(days=max(options["days"], 1) - 1)
+        day = start
+        visit_rows = action_rows = 0
+        while day <= yesterday:
+            visits, actions = rollup_day(day)
+            visit_rows += visits
+            action_rows += actions
+            day += timedelta(days=1)
+        if start <= yesterday:
+            set_rolled_up_through(yesterday)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rolled up {start} to {yesterday}: {visit_rows} visit row(s), {action_rows} action row(s)."
+            )
+        )
@@ -1,6 +1,7 @@
 ﻿from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from cards.caching import invalidate_profile_page
 from cards.models import Profile
 
 
@@ -10,5 +11,8 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         now = timezone.now()
         expired = Profile.objects.filter(hosting_expires_at__lt=now, status="live")
+        stale = list(expired.only("code", "slug"))
         count = expired.update(status="suspended")
+        for profile in stale:
+            invalidate_profile_page(profile)
         self.stdout.write(self.style.SUCCESS(f"Suspended {count} expired profiles."))
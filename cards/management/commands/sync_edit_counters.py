@@ -0,0 +1,35 @@
+﻿from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from cards.models import EditLog, Profile
+
+
+def logged_edits():
+    return Coalesce(
+        Subquery(
+            EditLog.objects.filter(profile=OuterRef("pk"))
+            .order_by()
+            .values("profile")
+            .annotate(total=Count("id"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Repair Profile.edits_used where it has drifted from the EditLog rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the drifted profiles")
+
+    def handle(self, *args, **options):
+        drifted = Profile.objects.exclude(edits_used=logged_edits())
+        if options["dry_run"]:
+            rows = drifted.annotate(logged=logged_edits()).values_list("code", "edits_used", "logged")
+            for code, used, logged in rows.iterator():
+                self.stdout.write(f"{code}: edits_used={used}, logged={logged}")
+            return
+        fixed = drifted.update(edits_used=logged_edits())
+        self.stdout.write(self.style.SUCCESS(f"Repaired edit counters on {fixed} profile(s)."))
@@ -0,0 +1,40 @@
+﻿from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from cards.counters import ACTIONS_COUNTER, VISITS_COUNTER, action_counter_name
+from cards.models import Action, DailyActionStat, DailyVisitStat, EventCounter, Visit
+from cards.rollups import EVENTS_ARCHIVED, watermark
+
+
+class Command(BaseCommand):
+    help = "Reset the all-time visit/action counters from the event tables"
+
+    def handle(self, *args, **options):
+        totals = Counter()
+        totals[VISITS_COUNTER] = Visit.objects.count()
+        for row in Action.objects.values("action_type").annotate(total=Count("id")):
+            totals[action_counter_name(row["action_type"])] += row["total"]
+        # Archived months only survive as rollups.
+        archived = watermark(EVENTS_ARCHIVED)
+        if archived:
+            totals[VISITS_COUNTER] += (
+                DailyVisitStat.objects.filter(day__lte=archived).aggregate(total=Sum("total"))["total"] or 0
+            )
+            archived_actions = DailyActionStat.objects.filter(day__lte=archived)
+            for row in archived_actions.values("action_type").annotate(total=Sum("total")):
+                totals[action_counter_name(row["action_type"])] += row["total"]
+        totals[ACTIONS_COUNTER] = sum(
+            total for name, total in totals.items() if name not in (VISITS_COUNTER, ACTIONS_COUNTER)
+        )
+        with transaction.atomic():
+            EventCounter.objects.exclude(name__in=list(totals)).update(total=0)
+            for name, total in totals.items():
+                EventCounter.objects.update_or_create(name=name, defaults={"total": total})
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Counters set to {totals[VISITS_COUNTER]} visit(s) and {totals[ACTIONS_COUNTER]} action(s)."
+            )
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0003_alter_visit_visited_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='action',
+            name='visit',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='actions', to='cards.visit'),
+        ),
+    ]
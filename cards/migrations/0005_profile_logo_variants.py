@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0004_action_visit_no_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='logo_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
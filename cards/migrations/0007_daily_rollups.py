@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-17 01:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0006_visitorsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=60, unique=True)),
+                ('day', models.DateField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyActionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('action_type', models.CharField(max_length=40)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_action_stats', to='cards.profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile', 'day', 'action_type'), name='unique_daily_action_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyVisitStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('device_type', models.CharField(blank=True, max_length=40)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_visit_stats', to='cards.profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile', 'day', 'device_type'), name='unique_daily_visit_stat')],
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+from datetime import date, datetime, timezone
+
+from django.db import migrations
+
+# Raw event tables and their partition keys. The database primary key becomes
+# (id, <key>) because Postgres requires the key in every unique constraint;
+# ids still come from one sequence, so Django keeps treating id as the pk.
+EVENT_TABLES = (("cards_visit", "visited_at"), ("cards_action", "created_at"))
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_table(cursor, table, column):
+    legacy = f"{table}_legacy"
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+    last_value, is_called = cursor.fetchone()
+    cursor.execute(
+        """
+        SELECT con.conname, pg_get_constraintdef(con.oid)
+        FROM pg_constraint con
+        WHERE con.conrelid = %s::regclass AND con.contype = 'f'
+        """,
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE tablename = %s AND indexname NOT IN (
+            SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'
+        )
+        """,
+        [table, table],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(f"SELECT date_trunc('month', min({column})) FROM {table}")
+    first = cursor.fetchone()[0]
+
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    for name, _ in foreign_keys:
+        cursor.execute(f"ALTER TABLE {legacy} DROP CONSTRAINT {name}")
+    for name, _ in indexes:
+        cursor.execute(f"DROP INDEX {name}")
+    cursor.execute(f"ALTER TABLE {legacy} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+    cursor.execute(f"ALTER TABLE {legacy} ALTER COLUMN id DROP DEFAULT")
+    cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence}")
+
+    cursor.execute(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({column})"
+    )
+    cursor.execute(f"CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    cursor.execute(f"SELECT setval('{table}_id_seq', %s, %s)", [last_value, is_called])
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+    cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {column})")
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+    for _, definition in indexes:
+        cursor.execute(definition)
+
+    # Month bounds are UTC, the session time zone Django uses.
+    month = (first.date() if first else datetime.now(timezone.utc).date()).replace(day=1)
+    last = _add_months(datetime.now(timezone.utc).date().replace(day=1), PARTITIONS_AHEAD)
+    while month <= last:
+        cursor.execute(
+            f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+            [f"{month.isoformat()} 00:00:00+00", f"{_add_months(month, 1).isoformat()} 00:00:00+00"],
+        )
+        month = _add_months(month, 1)
+    cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    cursor.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+    cursor.execute(f"DROP TABLE {legacy}")
+
+
+def partition_event_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, column in EVENT_TABLES:
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+            if cursor.fetchone() is None:
+                _partition_table(cursor, table, column)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0007_daily_rollups'),
+    ]
+
+    operations = [
+        # Reversing keeps the partitioned tables; they have the same columns.
+        migrations.RunPython(partition_event_tables, migrations.RunPython.noop),
+    ]
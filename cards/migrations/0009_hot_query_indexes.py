@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+from cards.operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cards', '0008_partition_events'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='action',
+            index=models.Index(fields=['profile', 'created_at'], name='action_profile_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='action',
+            index=models.Index(fields=['action_type', 'created_at'], name='action_type_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='action',
+            index=models.Index(fields=['created_at'], name='action_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='profile',
+            index=models.Index(fields=['hosting_expires_at'], name='profile_expiry_idx'),
+        ),
+        AddIndexOnline(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('status', 'live')), fields=['hosting_expires_at'], name='profile_live_expiry_idx'),
+        ),
+        AddIndexOnline(
+            model_name='visit',
+            index=models.Index(fields=['profile', 'visited_at'], name='visit_profile_visited_idx'),
+        ),
+        AddIndexOnline(
+            model_name='visit',
+            index=models.Index(fields=['visited_at'], name='visit_visited_idx'),
+        ),
+    ]
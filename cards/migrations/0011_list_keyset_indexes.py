@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-17 01:21
+
+from django.db import migrations, models
+
+from cards.operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cards', '0010_event_counters'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='customer',
+            index=models.Index(fields=['created_at', 'id'], name='customer_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='customer',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='customer_status_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='customer',
+            index=models.Index(fields=['package', 'created_at', 'id'], name='customer_package_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='order',
+            index=models.Index(fields=['package', 'created_at', 'id'], name='order_package_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='profile',
+            index=models.Index(fields=['created_at', 'id'], name='profile_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='profile',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='profile_status_created_idx'),
+        ),
+    ]
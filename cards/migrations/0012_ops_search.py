@@ -0,0 +1,66 @@
+# Generated by Django 6.0 on 2026-10-17 02:05
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from cards.operations import AddIndexOnline
+from cards.phones import normalize_phone
+
+BATCH_SIZE = 2000
+
+
+def backfill_phone_normalized(apps, schema_editor):
+    Customer = apps.get_model("cards", "Customer")
+    batch = []
+    for customer in Customer.objects.only("id", "phone").order_by("id").iterator(chunk_size=BATCH_SIZE):
+        customer.phone_normalized = normalize_phone(customer.phone)
+        batch.append(customer)
+        if len(batch) >= BATCH_SIZE:
+            Customer.objects.bulk_update(batch, ["phone_normalized"])
+            batch = []
+    if batch:
+        Customer.objects.bulk_update(batch, ["phone_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cards', '0011_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(backfill_phone_normalized, migrations.RunPython.noop),
+        TrigramExtension(),
+        AddIndexOnline(
+            model_name='customer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['full_name'], name='customer_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexOnline(
+            model_name='customer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['email'], name='customer_email_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexOnline(
+            model_name='customer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['phone_normalized'], name='customer_phone_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexOnline(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['code'], name='profile_code_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexOnline(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['slug'], name='profile_slug_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexOnline(
+            model_name='order',
+            index=models.Index(fields=['tracking_code'], name='order_tracking_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-17 02:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_edits_used(apps, schema_editor):
+    EditLog = apps.get_model("cards", "EditLog")
+    Profile = apps.get_model("cards", "Profile")
+    logged = (
+        EditLog.objects.filter(profile=OuterRef("pk"))
+        .order_by()
+        .values("profile")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    Profile.objects.update(edits_used=Coalesce(Subquery(logged), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0012_ops_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='edits_used',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_edits_used, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0013_profile_edits_used'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('batch', models.CharField(blank=True, max_length=60)),
+                ('encoded_at', models.DateTimeField(blank=True, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('claimed_at__isnull', True)), fields=['id'], name='profilecode_free_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-17 04:10
+
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+from cards.constants import ACTION_TYPES
+
+
+def seed_event_counters(apps, schema_editor):
+    # 0010 created the counters at zero; start them from the event tables
+    # (and the rollups of archived months), as sync_event_counters does.
+    Visit = apps.get_model("cards", "Visit")
+    Action = apps.get_model("cards", "Action")
+    DailyVisitStat = apps.get_model("cards", "DailyVisitStat")
+    DailyActionStat = apps.get_model("cards", "DailyActionStat")
+    RollupWatermark = apps.get_model("cards", "RollupWatermark")
+    EventCounter = apps.get_model("cards", "EventCounter")
+
+    def by_type(rows, total):
+        for row in rows:
+            name = row["action_type"] if row["action_type"] in ACTION_TYPES else "other"
+            totals[f"actions:{name}"] += row[total]
+
+    totals = Counter(visits=Visit.objects.count())
+    by_type(Action.objects.values("action_type").annotate(total=Count("id")), "total")
+    archived = RollupWatermark.objects.filter(name="events-archived").values_list("day", flat=True).first()
+    if archived:
+        totals["visits"] += (
+            DailyVisitStat.objects.filter(day__lte=archived).aggregate(total=Sum("total"))["total"] or 0
+        )
+        by_type(
+            DailyActionStat.objects.filter(day__lte=archived).values("action_type").annotate(total=Sum("total")),
+            "total",
+        )
+    totals["actions"] = sum(total for name, total in totals.items() if name.startswith("actions:"))
+    for name, total in totals.items():
+        EventCounter.objects.update_or_create(name=name, defaults={"total": total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0014_profile_code_inventory'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_event_counters, migrations.RunPython.noop),
+    ]
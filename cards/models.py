@@ -1,4 +1,5 @@
 ﻿from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.utils import timezone
 
@@ -10,6 +11,7 @@ from .constants import (
     PROFILE_STATUS_CHOICES,
     TEMPLATE_CHOICES,
 )
+from .phones import NORMALIZED_PHONE_LENGTH, normalize_phone
 
 
 class TimestampedModel(models.Model):
@@ -31,12 +33,32 @@ class Customer(TimestampedModel):
     full_name = models.CharField(max_length=120)
     email = models.EmailField()
     phone = models.CharField(max_length=30)
+    # Kept in step with phone by save(); see cards.phones.
+    phone_normalized = models.CharField(max_length=NORMALIZED_PHONE_LENGTH, blank=True, default="")
     package = models.CharField(max_length=20, choices=PACKAGE_CHOICES)
     status = models.CharField(max_length=20, choices=CUSTOMER_STATUS_CHOICES, default="active")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="customer_created_idx"),
+            models.Index(fields=["status", "created_at", "id"], name="customer_status_created_idx"),
+            models.Index(fields=["package", "created_at", "id"], name="customer_package_created_idx"),
+            # Trigram indexes for cards.search (Postgres only).
+            GinIndex(fields=["full_name"], opclasses=["gin_trgm_ops"], name="customer_name_trgm_idx"),
+            GinIndex(fields=["email"], opclasses=["gin_trgm_ops"], name="customer_email_trgm_idx"),
+            GinIndex(fields=["phone_normalized"], opclasses=["gin_trgm_ops"], name="customer_phone_trgm_idx"),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.package})"
 
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_normalized"}
+        super().save(*args, **kwargs)
+
 
 class Profile(TimestampedModel):
     customer = models.OneToOneField(Customer, on_delete=models.CASCADE, related_name="profile")
@@ -46,8 +68,25 @@ class Profile(TimestampedModel):
     theme_json = models.JSONField(default=dict)
     content_json = models.JSONField(default=dict)
     logo = models.ImageField(upload_to="logos/", null=True, blank=True)
+    logo_variants = models.JSONField(default=dict, blank=True)
     status = models.CharField(max_length=20, choices=PROFILE_STATUS_CHOICES, default="draft")
     hosting_expires_at = models.DateTimeField()
+    # Number of EditLog rows, bumped with F() by services.record_edit.
+    edits_used = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["hosting_expires_at"], name="profile_expiry_idx"),
+            models.Index(
+                fields=["hosting_expires_at"],
+                condition=models.Q(status="live"),
+                name="profile_live_expiry_idx",
+            ),
+            models.Index(fields=["created_at", "id"], name="profile_created_idx"),
+            models.Index(fields=["status", "created_at", "id"], name="profile_status_created_idx"),
+            GinIndex(fields=["code"], opclasses=["gin_trgm_ops"], name="profile_code_trgm_idx"),
+            GinIndex(fields=["slug"], opclasses=["gin_trgm_ops"], name="profile_slug_trgm_idx"),
+        ]
 
     def __str__(self):
         return f"{self.customer.full_name} - {self.code}"
@@ -69,6 +108,25 @@ class Profile(TimestampedModel):
         return None
 
 
+class ProfileCode(models.Model):
+    # Pre-minted code inventory (see services.claim_profile_codes). Codes are
+    # handed out oldest first, so tags encoded from the head of the queue
+    # ahead of demand are the next ones assigned.
+    code = models.CharField(max_length=20, unique=True)
+    batch = models.CharField(max_length=60, blank=True)
+    encoded_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(claimed_at__isnull=True), name="profilecode_free_idx"),
+        ]
+
+    def __str__(self):
+        return self.code
+
+
 class Order(TimestampedModel):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="orders")
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="orders")
@@ -84,6 +142,14 @@ class Order(TimestampedModel):
     tracking_code = models.CharField(max_length=80, null=True, blank=True)
     notes = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+            models.Index(fields=["package", "created_at", "id"], name="order_package_created_idx"),
+            models.Index(fields=["tracking_code"], name="order_tracking_idx"),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.customer.full_name}"
 
@@ -117,21 +183,113 @@ class Visit(models.Model):
     device_type = models.CharField(max_length=40, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["profile", "visited_at"], name="visit_profile_visited_idx"),
+            models.Index(fields=["visited_at"], name="visit_visited_idx"),
+        ]
+
     def __str__(self):
         return f"Visit {self.profile.code} at {self.visited_at}"
 
 
+class VisitorSketch(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="visitor_sketches")
+    day = models.DateField()
+    # zlib-compressed HyperLogLog registers, see cards.sketches.
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["profile", "day"], name="unique_visitor_sketch_day"),
+        ]
+
+    def __str__(self):
+        return f"Visitors {self.profile.code} on {self.day}"
+
+
 class Action(models.Model):
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="actions")
-    visit = models.ForeignKey(Visit, on_delete=models.SET_NULL, null=True, blank=True, related_name="actions")
+    # No database constraint: with VISIT_WRITE_BEHIND an action may reference a
+    # visit that is still waiting in a worker's buffer.
+    visit = models.ForeignKey(
+        Visit,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="actions",
+        db_constraint=False,
+    )
     action_type = models.CharField(max_length=40)
     action_value = models.CharField(max_length=255, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["profile", "created_at"], name="action_profile_created_idx"),
+            models.Index(fields=["action_type", "created_at"], name="action_type_created_idx"),
+            models.Index(fields=["created_at"], name="action_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.action_type} - {self.profile.code}"
 
 
+class DailyVisitStat(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="daily_visit_stats")
+    day = models.DateField()
+    device_type = models.CharField(max_length=40, blank=True)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["profile", "day", "device_type"], name="unique_daily_visit_stat"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.profile.code} {self.day} {self.device_type}: {self.total}"
+
+
+class DailyActionStat(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="daily_action_stats")
+    day = models.DateField()
+    action_type = models.CharField(max_length=40)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["profile", "day", "action_type"], name="unique_daily_action_stat"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.profile.code} {self.day} {self.action_type}: {self.total}"
+
+
+class EventCounter(models.Model):
+    # All-time totals, bumped by cards.counters as visits and actions are written.
+    name = models.CharField(max_length=60, unique=True)
+    total = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.total}"
+
+
+class RollupWatermark(models.Model):
+    # Last day whose rollup rows are complete; later days are read from raw rows.
+    name = models.CharField(max_length=60, unique=True)
+    day = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} through {self.day}"
+
+
 class EditLog(models.Model):
     EDIT_TYPE_CHOICES = [
         ("content", "Content"),
@@ -0,0 +1,69 @@
+from django.contrib.postgres.indexes import PostgresIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+
+
+def _partitions(cursor, table):
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = %s::regclass
+        """,
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+    return cursor.fetchone() is not None
+
+
+class AddIndexOnline(AddIndexConcurrently):
+    # CREATE INDEX CONCURRENTLY, extended to partitioned tables (which reject
+    # it): the parent index is created ON ONLY the parent, each partition is
+    # indexed concurrently and attached. Other databases get a plain index,
+    # or none for Postgres-only index types (GIN etc.).
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            model = to_state.apps.get_model(app_label, self.model_name)
+            if self.allow_migrate_model(connection.alias, model) and not isinstance(self.index, PostgresIndex):
+                schema_editor.add_index(model, self.index)
+            return
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if not _is_partitioned(cursor, table):
+                schema_editor.add_index(model, self.index, concurrently=True)
+                return
+            quote = schema_editor.quote_name
+            parent_sql = str(self.index.create_sql(model, schema_editor))
+            cursor.execute(parent_sql.replace(f" ON {quote(table)}", f" ON ONLY {quote(table)}", 1))
+            for partition in _partitions(cursor, table):
+                name = f"{partition}_{self.index.name}"[: connection.ops.max_name_length()]
+                statement = self.index.create_sql(model, schema_editor, concurrently=True)
+                statement.rename_table_references(table, partition)
+                statement.parts["name"] = quote(name)
+                cursor.execute(str(statement))
+                cursor.execute(f"ALTER INDEX {quote(self.index.name)} ATTACH PARTITION {quote(name)}")
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                partitioned = _is_partitioned(cursor, model._meta.db_table)
+            if not partitioned:
+                super().database_backwards(app_label, schema_editor, from_state, to_state)
+                return
+        elif isinstance(self.index, PostgresIndex):
+            return
+        # Dropping a partitioned index drops the attached partition indexes.
+        schema_editor.remove_index(model, self.index)
@@ -0,0 +1,51 @@
+import base64
+import binascii
+from datetime import datetime
+
+
+def encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.pk}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_page(queryset, after=None, before=None, size=50):
+    # Newest first, keyed on (created_at, id): every page is an index range
+    # scan, however deep into the list it is.
+    before_key = decode_cursor(before)
+    after_key = decode_cursor(after)
+    if before_key:
+        created_at, pk = before_key
+        rows = list(
+            queryset.filter(created_at__gte=created_at)
+            .exclude(created_at=created_at, pk__lte=pk)
+            .order_by("created_at", "pk")[: size + 1]
+        )
+        has_newer = len(rows) > size
+        rows = rows[:size][::-1]
+        has_older = True
+    else:
+        if after_key:
+            created_at, pk = after_key
+            queryset = queryset.filter(created_at__lte=created_at).exclude(
+                created_at=created_at, pk__gte=pk
+            )
+        rows = list(queryset.order_by("-created_at", "-pk")[: size + 1])
+        has_older = len(rows) > size
+        rows = rows[:size]
+        has_newer = after_key is not None
+    return {
+        "rows": rows,
+        "newer_cursor": encode_cursor(rows[0]) if rows and has_newer else None,
+        "older_cursor": encode_cursor(rows[-1]) if rows and has_older else None,
+    }
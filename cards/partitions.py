@@ -0,0 +1,123 @@
+import re
+from datetime import date, datetime, time, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import Action, Visit
+
+# Monthly range partitions are created by migration 0008 on Postgres and kept
+# a year ahead by ensure_event_partitions (run from rollup_analytics and
+# archive_events); month bounds are UTC.
+PARTITIONED_EVENTS = ((Visit, "visited_at"), (Action, "created_at"))
+PARTITIONS_AHEAD = 12
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    start = datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+    end = datetime.combine(add_months(month, 1), time.min, tzinfo=dt_timezone.utc)
+    return start, end
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(table):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+        return cursor.fetchone() is not None
+
+
+def partition_months(table):
+    pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})(\d{{2}})$")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def default_partition(table):
+    return f"{table}_default"
+
+
+def _default_months(cursor, table, column):
+    cursor.execute("SELECT to_regclass(%s)", [default_partition(table)])
+    if cursor.fetchone()[0] is None:
+        return set()
+    cursor.execute(
+        f"SELECT DISTINCT date_trunc('month', \"{column}\" AT TIME ZONE 'UTC')::date "
+        f'FROM "{default_partition(table)}"'
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _create_partition(cursor, table, column, month, move_rows):
+    start, end = month_bounds(month)
+    create = (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, month)}" '
+        f'PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)'
+    )
+    if not move_rows:
+        cursor.execute(create, [start, end])
+        return
+    # Postgres refuses a partition whose range has rows in the DEFAULT
+    # partition, so those rows are moved across with the default detached.
+    default = default_partition(table)
+    in_range = f'"{column}" >= %s AND "{column}" < %s'
+    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+    cursor.execute(create, [start, end])
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{default}" WHERE {in_range}', [start, end])
+    cursor.execute(f'DELETE FROM "{default}" WHERE {in_range}', [start, end])
+    cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+
+
+def ensure_partitions(table, column, through):
+    # Creates every missing month up to `through`, plus any month whose rows
+    # ended up in the default partition because it had no partition yet.
+    existing = set(partition_months(table))
+    with connection.cursor() as cursor:
+        stranded = _default_months(cursor, table, column)
+    month = add_months(max(existing), 1) if existing else through.replace(day=1)
+    months = set(stranded)
+    while month <= through:
+        months.add(month)
+        month = add_months(month, 1)
+    created = []
+    for month in sorted(months - existing):
+        with transaction.atomic(), connection.cursor() as cursor:
+            _create_partition(cursor, table, column, month, month in stranded)
+        created.append(month)
+    return created
+
+
+def ensure_event_partitions(today):
+    through = add_months(today.replace(day=1), PARTITIONS_AHEAD)
+    return {
+        model._meta.db_table: ensure_partitions(model._meta.db_table, column, through)
+        for model, column in PARTITIONED_EVENTS
+        if is_partitioned(model._meta.db_table)
+    }
+
+
+def drop_partition(table, month):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{partition_name(table, month)}"')
@@ -0,0 +1,26 @@
+import re
+
+from django.conf import settings
+
+NORMALIZED_PHONE_LENGTH = 20
+
+
+def normalize_phone(phone):
+    # Digits only, international form without the "+", so "+233 24 123 4567",
+    # "00233241234567" and "024-123-4567" all store as "233241234567".
+    phone = (phone or "").strip()
+    digits = re.sub(r"\D", "", phone)
+    if not digits:
+        return ""
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0") and not phone.startswith("+"):
+        digits = settings.PHONE_DEFAULT_COUNTRY_CODE + digits[1:]
+    return digits[:NORMALIZED_PHONE_LENGTH]
+
+
+def phone_search_digits(term):
+    # The part of a typed number that is the same in every stored form: a
+    # leading 0 / 00 / + is dropped and the rest matched as a substring.
+    digits = re.sub(r"\D", "", term or "").lstrip("0")
+    return digits if len(digits) >= 4 else ""
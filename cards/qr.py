@@ -0,0 +1,206 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import qrcode
+from django.conf import settings
+from django.urls import reverse
+
+from .services import build_vcard
+
+QR_TYPES = ("vcard", "call", "url")
+QR_TYPE_ALIASES = {"contact": "vcard", "save": "vcard"}
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+QR_SIZES = {"sm": 4, "md": 6, "lg": 10, "print": 20}
+QR_ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+QR_RENDER_OPTIONS = {"version": 1, "box_size": 6, "border": 2, "error_correction": "M", "format": "png"}
+logger = logging.getLogger(__name__)
+
+
+class QRPayloadError(ValueError):
+    pass
+
+
+def qr_payload(profile, qr_type, base_url):
+    qr_type = QR_TYPE_ALIASES.get(qr_type, qr_type)
+    content = profile.content_json or {}
+    if qr_type == "call":
+        phone = content.get("phone") or content.get("whatsapp")
+        if not phone:
+            raise QRPayloadError("phone-missing")
+        return f"tel:{phone}"
+    if qr_type == "vcard":
+        return build_vcard(profile)
+    if qr_type == "url":
+        return f"{base_url.rstrip('/')}{reverse('profile-by-code', args=[profile.code])}"
+    raise QRPayloadError("invalid-type")
+
+
+def qr_options(fmt=None, size=None, error_correction=None):
+    fmt = (fmt or "png").lower()
+    size = (size or "md").lower()
+    error_correction = (error_correction or "M").upper()
+    if fmt not in QR_FORMATS:
+        raise QRPayloadError("invalid-format")
+    if size not in QR_SIZES:
+        raise QRPayloadError("invalid-size")
+    if error_correction not in QR_ERROR_CORRECTION:
+        raise QRPayloadError("invalid-error-correction")
+    return {
+        **QR_RENDER_OPTIONS,
+        "box_size": QR_SIZES[size],
+        "error_correction": error_correction,
+        "format": fmt,
+    }
+
+
+def qr_cache_key(data, options=QR_RENDER_OPTIONS):
+    material = json.dumps([data, options], sort_keys=True).encode("utf-8")
+    return hashlib.sha256(material).hexdigest()
+
+
+def qr_cache_path(key, options=QR_RENDER_OPTIONS, cache_dir=None):
+    return Path(cache_dir or settings.QR_CACHE_DIR) / key[:2] / f"{key}.{options['format']}"
+
+
+def _render_svg(matrix, box_size):
+    # One path of horizontal runs keeps the file a few KB regardless of size;
+    # qrcode's SVG factories emit a rect or sub-path per module.
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            runs.append(f"M{start} {y}h{x - start}v1H{start}z")
+    modules = len(matrix)
+    pixels = modules * box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+        f'<path d="{"".join(runs)}"/></svg>'
+    ).encode("utf-8")
+
+
+def render_qr(data, options=QR_RENDER_OPTIONS):
+    qr = qrcode.QRCode(
+        version=options["version"],
+        box_size=options["box_size"],
+        border=options["border"],
+        error_correction=QR_ERROR_CORRECTION[options["error_correction"]],
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    if options["format"] == "svg":
+        return _render_svg(qr.get_matrix(), options["box_size"])
+    buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _write_atomic(path, payload):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as tmp:
+            tmp.write(payload)
+        os.replace(tmp_name, path)
+    except OSError:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def get_qr_image(data, options=QR_RENDER_OPTIONS):
+    key = qr_cache_key(data, options)
+    path = qr_cache_path(key, options)
+    try:
+        return key, path.read_bytes()
+    except FileNotFoundError:
+        pass
+    image = render_qr(data, options)
+    try:
+        _write_atomic(path, image)
+    except OSError:
+        # A read-only or full disk only costs us the cache, not the image.
+        pass
+    return key, image
+
+
+def prune_qr_cache(max_age_days, cache_dir=None):
+    # Files are named by payload, so edited profiles leave their old images
+    # behind; anything not written for max_age_days is removed and simply
+    # re-rendered on its next request.
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for path in Path(cache_dir or settings.QR_CACHE_DIR).glob("*/*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+QR_PRERENDER_VARIANTS = (QR_RENDER_OPTIONS, qr_options(fmt="svg"))
+
+
+def profile_qr_payloads(profile, base_url):
+    payloads = []
+    for qr_type in QR_TYPES:
+        try:
+            payloads.append(qr_payload(profile, qr_type, base_url))
+        except QRPayloadError:
+            continue
+    return payloads
+
+
+def render_qr_file(data, cache_dir, options=QR_RENDER_OPTIONS):
+    # Top-level and settings-free so it can run in a ProcessPoolExecutor worker.
+    path = qr_cache_path(qr_cache_key(data, options), options, cache_dir)
+    if path.exists():
+        return False
+    _write_atomic(path, render_qr(data, options))
+    return True
+
+
+def prerender_profile_qr(profile, base_url=None):
+    base_url = base_url or settings.SITE_URL
+    return sum(
+        render_qr_file(data, settings.QR_CACHE_DIR, options)
+        for data in profile_qr_payloads(profile, base_url)
+        for options in QR_PRERENDER_VARIANTS
+    )
+
+
+_prerender_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qr-prerender")
+
+
+def _prerender_logged(profile):
+    # The pool's future is discarded, so failures are only seen in the log;
+    # the images are still rendered on their first request.
+    try:
+        prerender_profile_qr(profile)
+    except Exception:
+        logger.exception("Could not pre-render QR images for profile %s", profile.code)
+
+
+def enqueue_prerender_qr(profile):
+    _prerender_pool.submit(_prerender_logged, profile)
@@ -0,0 +1,162 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+
+from .models import Profile
+
+GENERATION_KEY = "profile-resolver:generation"
+GENERATION_CHECK_INTERVAL = 5
+LOOKUPS = ("code", "slug")
+PUBLISHED_FIELDS = {"code", "slug", "status"}
+
+
+class BloomFilter:
+    def __init__(self, capacity=100_000, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+
+class ProfileResolver:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {lookup: {} for lookup in LOOKUPS}
+        self._missing = {}
+        self._missing_since = 0
+        self._loaded = False
+        self._generation = None
+        self._checked_at = 0
+
+    def warm(self):
+        index = {lookup: {} for lookup in LOOKUPS}
+        rows = Profile.objects.values_list("id", "code", "slug").iterator(chunk_size=5000)
+        for profile_id, code, slug in rows:
+            index["code"][code] = profile_id
+            if slug:
+                index["slug"][slug] = profile_id
+        with self._lock:
+            self._index = index
+            self._reset_missing()
+            self._loaded = True
+            self._generation = cache.get(GENERATION_KEY)
+            self._checked_at = time.monotonic()
+
+    def _reset_missing(self):
+        self._missing = {lookup: BloomFilter() for lookup in LOOKUPS}
+        self._missing_since = time.monotonic()
+
+    def _refresh(self):
+        if not self._loaded:
+            self.warm()
+            return
+        now = time.monotonic()
+        if now - self._missing_since >= settings.PROFILE_RESOLVER_NEGATIVE_TTL:
+            with self._lock:
+                self._reset_missing()
+        if now - self._checked_at < GENERATION_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        generation = cache.get(GENERATION_KEY)
+        if generation != self._generation:
+            # Another worker created or re-slugged a profile: forget negatives so
+            # the new value is looked up, and pick it up on the first hit.
+            with self._lock:
+                self._generation = generation
+                self._reset_missing()
+
+    def register(self, profile, publish=False):
+        with self._lock:
+            self._index["code"][profile.code] = profile.pk
+            if profile.slug:
+                self._index["slug"][profile.slug] = profile.pk
+        if publish:
+            try:
+                cache.incr(GENERATION_KEY)
+            except ValueError:
+                cache.set(GENERATION_KEY, 1, None)
+
+    def profile_id(self, lookup, value):
+        if settings.PROFILE_RESOLVER_ENABLED:
+            self._refresh()
+            profile_id = self._index[lookup].get(value)
+            if profile_id is not None:
+                return profile_id
+        profile = self.resolve(lookup, value)
+        return profile.pk if profile else None
+
+    def resolve(self, lookup, value):
+        # Callers need the full row, which costs the same unique-index query
+        # as going through the positive index, so only the negative set is
+        # used here; profile_id() is where the positive index saves a query.
+        if not settings.PROFILE_RESOLVER_ENABLED:
+            return Profile.objects.select_related("customer").filter(**{lookup: value}).first()
+
+        self._refresh()
+        if value in self._missing[lookup] and value not in self._index[lookup]:
+            return None
+        profile = Profile.objects.select_related("customer").filter(**{lookup: value}).first()
+        if profile:
+            self.register(profile)
+            return profile
+        with self._lock:
+            index = self._index[lookup]
+            if value in index:
+                del index[value]
+            missing = self._missing[lookup]
+            if missing.is_full:
+                self._reset_missing()
+                missing = self._missing[lookup]
+            missing.add(value)
+        return None
+
+
+profile_resolver = ProfileResolver()
+
+
+def publish_profile_change(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    # post_save receiver: any save that can add or change a code or slug
+    # (checkout, dj-admin, ops edits) tells every worker to forget its
+    # negative lookups once the transaction commits. bulk_create skips
+    # signals; bulk imports publish once per chunk instead.
+    if raw:
+        return
+    if created or update_fields is None or PUBLISHED_FIELDS & set(update_fields):
+        transaction.on_commit(lambda: profile_resolver.register(instance, publish=True))
+
+
+def warm_profile_resolver():
+    if not settings.PROFILE_RESOLVER_ENABLED:
+        return
+    try:
+        profile_resolver.warm()
+    except DatabaseError:
+        # The index is built lazily on the first request instead.
+        return
+    finally:
+        connections.close_all()
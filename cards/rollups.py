@@ -0,0 +1,239 @@
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, DateField, F, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Action, DailyActionStat, DailyVisitStat, RollupWatermark, Visit
+
+ANALYTICS_ROLLUP = "analytics"
+# Last day whose raw events were archived and dropped by archive_events.
+EVENTS_ARCHIVED = "events-archived"
+ROLLUP_BATCH_SIZE = 1000
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def watermark(name):
+    return RollupWatermark.objects.filter(name=name).values_list("day", flat=True).first()
+
+
+def set_watermark(name, day):
+    RollupWatermark.objects.update_or_create(name=name, defaults={"day": day})
+
+
+def rolled_up_through():
+    return watermark(ANALYTICS_ROLLUP)
+
+
+def set_rolled_up_through(day):
+    set_watermark(ANALYTICS_ROLLUP, day)
+
+
+def first_event_day():
+    days = [
+        Visit.objects.aggregate(first=Min("visited_at"))["first"],
+        Action.objects.aggregate(first=Min("created_at"))["first"],
+    ]
+    days = [timezone.localdate(value) for value in days if value]
+    return min(days) if days else None
+
+
+def _stream_rows(queryset, build):
+    # iterator() uses a server-side cursor on Postgres, so a wide window never
+    # materialises its grouped rows in memory.
+    batch = []
+    for row in queryset.iterator(chunk_size=ROLLUP_BATCH_SIZE * 2):
+        batch.append(build(row))
+        if len(batch) >= ROLLUP_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _visit_groups(visits):
+    return (
+        visits.annotate(day=TruncDate("visited_at"), device=Coalesce("device_type", Value("")))
+        .values("profile_id", "day", "device")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+
+
+def _action_groups(actions):
+    return (
+        actions.annotate(day=TruncDate("created_at"))
+        .values("profile_id", "day", "action_type")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+
+
+def _visit_stat(row):
+    return DailyVisitStat(
+        profile_id=row["profile_id"], day=row["day"], device_type=row["device"], total=row["total"]
+    )
+
+
+def _action_stat(row):
+    return DailyActionStat(
+        profile_id=row["profile_id"], day=row["day"], action_type=row["action_type"], total=row["total"]
+    )
+
+
+@transaction.atomic
+def rollup_range(first_day, last_day, profile_ids=None):
+    # Recomputes whole days, so re-running a window after late visits (buffer
+    # flushes, spool replays) or a rollup fix simply replaces its totals.
+    archived = watermark(EVENTS_ARCHIVED)
+    if archived and first_day <= archived:
+        # Only the rollups are left for archived days; never recompute them.
+        first_day = archived + timedelta(days=1)
+        if first_day > last_day:
+            return 0, 0
+    start, end = day_start(first_day), day_start(last_day + timedelta(days=1))
+    visits = Visit.objects.filter(visited_at__gte=start, visited_at__lt=end)
+    actions = Action.objects.filter(created_at__gte=start, created_at__lt=end)
+    visit_stats = DailyVisitStat.objects.filter(day__gte=first_day, day__lte=last_day)
+    action_stats = DailyActionStat.objects.filter(day__gte=first_day, day__lte=last_day)
+    if profile_ids:
+        in_range = {"profile_id__gte": profile_ids[0], "profile_id__lte": profile_ids[1]}
+        visits = visits.filter(**in_range)
+        actions = actions.filter(**in_range)
+        visit_stats = visit_stats.filter(**in_range)
+        action_stats = action_stats.filter(**in_range)
+    visit_stats.delete()
+    action_stats.delete()
+    visit_rows = action_rows = 0
+    for batch in _stream_rows(_visit_groups(visits), _visit_stat):
+        visit_rows += len(DailyVisitStat.objects.bulk_create(batch))
+    for batch in _stream_rows(_action_groups(actions), _action_stat):
+        action_rows += len(DailyActionStat.objects.bulk_create(batch))
+    return visit_rows, action_rows
+
+
+def rollup_day(day):
+    return rollup_range(day, day)
+
+
+ROLLUP_SOURCES = {
+    "visits": (DailyVisitStat, Visit, "visited_at"),
+    "actions": (DailyActionStat, Action, "created_at"),
+}
+
+
+def _raw_bucket(key, time_field):
+    if key == "day":
+        return TruncDate(time_field)
+    if key == "device_type":
+        return Coalesce("device_type", Value(""))
+    return F(key)
+
+
+def merged_counts(source, key, profile_id=None, since=None):
+    stat_model, raw_model, time_field = ROLLUP_SOURCES[source]
+    counts = Counter()
+    through = rolled_up_through()
+    if through and (not since or since <= through):
+        stats = stat_model.objects.filter(day__lte=through)
+        if profile_id:
+            stats = stats.filter(profile_id=profile_id)
+        if since:
+            stats = stats.filter(day__gte=since)
+        for row in stats.values(key).annotate(total=Sum("total")):
+            counts[row[key]] += row["total"]
+    if through:
+        since = max(since, through + timedelta(days=1)) if since else through + timedelta(days=1)
+    raw = raw_model.objects.all()
+    if profile_id:
+        raw = raw.filter(profile_id=profile_id)
+    if since:
+        raw = raw.filter(**{f"{time_field}__gte": day_start(since)})
+    raw = raw.annotate(bucket=_raw_bucket(key, time_field)).values("bucket").annotate(total=Count("id"))
+    for row in raw:
+        counts[row["bucket"]] += row["total"]
+    return counts
+
+
+def visits_by_day(profile_id=None, since=None):
+    return merged_counts("visits", "day", profile_id=profile_id, since=since)
+
+
+def visits_by_device(profile_id=None, since=None):
+    return merged_counts("visits", "device_type", profile_id=profile_id, since=since)
+
+
+def actions_by_type(profile_id=None, since=None):
+    return merged_counts("actions", "action_type", profile_id=profile_id, since=since)
+
+
+def _recent_day(day_expression, condition):
+    return Case(When(condition, then=day_expression), default=None, output_field=DateField())
+
+
+def profile_summary(profile_id, recent_days=7):
+    # Every dashboard figure in one UNION ALL round trip: visits by day and
+    # actions by (day, type), with days before the recent window folded into
+    # a single NULL-day bucket so the result stays a few dozen rows.
+    recent = timezone.localdate() - timedelta(days=recent_days - 1)
+    through = rolled_up_through()
+    parts = []
+    for source, (stat_model, raw_model, time_field) in ROLLUP_SOURCES.items():
+        bucket_type = F("action_type") if source == "actions" else Value("", output_field=CharField())
+        if through:
+            stats = stat_model.objects.filter(profile_id=profile_id, day__lte=through)
+            parts.append(
+                stats.values(
+                    kind=Value(source, output_field=CharField()),
+                    bucket_day=_recent_day(F("day"), Q(day__gte=recent)),
+                    bucket_type=bucket_type,
+                )
+                .annotate(total=Sum("total"))
+                .order_by()
+            )
+        raw = raw_model.objects.filter(profile_id=profile_id)
+        if through:
+            raw = raw.filter(**{f"{time_field}__gte": day_start(through + timedelta(days=1))})
+        parts.append(
+            raw.values(
+                kind=Value(source, output_field=CharField()),
+                bucket_day=_recent_day(TruncDate(time_field), Q(**{f"{time_field}__gte": day_start(recent)})),
+                bucket_type=bucket_type,
+            )
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+    totals = Counter()
+    recent_totals = Counter()
+    visits_by_day = Counter()
+    actions_by_type = Counter()
+    for row in parts[0].union(*parts[1:], all=True):
+        kind, total = row["kind"], row["total"]
+        totals[kind] += total
+        if row["bucket_day"] is not None:
+            recent_totals[kind] += total
+            if kind == "visits":
+                visits_by_day[row["bucket_day"]] += total
+        if kind == "actions":
+            actions_by_type[row["bucket_type"]] += total
+    return {
+        "total_visits": totals["visits"],
+        "total_actions": totals["actions"],
+        "visits_recent": recent_totals["visits"],
+        "actions_recent": recent_totals["actions"],
+        "visits_by_day": visits_by_day,
+        "actions_by_type": actions_by_type,
+    }
+
+
+def as_rows(counts, key, by_total=False):
+    if by_total:
+        ordered = counts.most_common()
+    else:
+        ordered = sorted(counts.items())
+    return [{key: bucket, "total": total} for bucket, total in ordered]
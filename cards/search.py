@@ -0,0 +1,125 @@
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Customer, Order, Profile
+from .phones import phone_search_digits
+
+SEARCH_MIN_LENGTH = 2
+SEARCH_MAX_LENGTH = 100
+SEARCH_LIMIT = 20
+
+
+def _exact(condition, default=0.0):
+    return Case(When(condition, then=Value(1.0)), default=Value(default), output_field=FloatField())
+
+
+def customer_search(term, digits=""):
+    # On Postgres every branch of the OR is served by a trigram GIN index:
+    # word similarity (<%) for names/emails, LIKE for the phone digits.
+    if connection.vendor == "postgresql":
+        match = Q(full_name__trigram_word_similar=term) | Q(email__trigram_word_similar=term)
+        rank = Greatest(
+            TrigramWordSimilarity(term, "full_name"),
+            TrigramWordSimilarity(term, "email"),
+        )
+    else:
+        match = Q(full_name__icontains=term) | Q(email__icontains=term)
+        rank = _exact(Q(full_name__iexact=term) | Q(email__iexact=term), 0.5)
+    if digits:
+        match |= Q(phone_normalized__contains=digits)
+        rank = Greatest(rank, _exact(Q(phone_normalized__contains=digits)))
+    return (
+        Customer.objects.filter(match)
+        .annotate(rank=rank)
+        .only("full_name", "email", "phone", "status")
+        .order_by("-rank", "-id")
+    )
+
+
+def profile_search(term):
+    code = term.upper()
+    if connection.vendor == "postgresql":
+        match = Q(code=code) | Q(code__trigram_word_similar=term) | Q(slug__trigram_word_similar=term)
+        rank = Greatest(
+            _exact(Q(code=code)),
+            TrigramWordSimilarity(term, "code"),
+            TrigramWordSimilarity(term, "slug"),
+        )
+    else:
+        match = Q(code=code) | Q(code__icontains=term) | Q(slug__icontains=term)
+        rank = _exact(Q(code=code) | Q(slug=term.lower()), 0.5)
+    return (
+        Profile.objects.filter(match)
+        .annotate(rank=rank)
+        .select_related("customer")
+        .only("code", "slug", "status", "customer__full_name")
+        .order_by("-rank", "-id")
+    )
+
+
+def _order_matches(term, customers, limit):
+    # Orders have nothing worth fuzzy-matching of their own: they are found
+    # by id, tracking code, or through the customers that matched.
+    order_id = term.lstrip("#")
+    match = Q(tracking_code=term)
+    if order_id.isdigit() and len(order_id) < 10:
+        match |= Q(pk=int(order_id))
+    customer_rank = {customer.pk: customer.rank for customer in customers}
+    if customer_rank:
+        match |= Q(customer_id__in=customer_rank)
+    orders = list(
+        Order.objects.filter(match)
+        .select_related("customer")
+        .only("status", "package", "tracking_code", "created_at", "customer__full_name")
+        .order_by("-created_at", "-id")[:limit]
+    )
+    for order in orders:
+        exact = order.tracking_code == term or str(order.pk) == order_id
+        order.rank = 1.0 if exact else customer_rank.get(order.customer_id, 0.0)
+    return orders
+
+
+def search_ops(term, limit=SEARCH_LIMIT):
+    term = " ".join((term or "").split())[:SEARCH_MAX_LENGTH]
+    if len(term) < SEARCH_MIN_LENGTH:
+        return []
+    customers = list(customer_search(term, phone_search_digits(term))[:limit])
+    profiles = list(profile_search(term)[:limit])
+    orders = _order_matches(term, customers, limit)
+    results = [
+        {
+            "kind": "customer",
+            "label": customer.full_name,
+            "detail": " · ".join(filter(None, [customer.email, customer.phone])),
+            "status": customer.status,
+            "url": f"/admin/customers/{customer.pk}/",
+            "rank": customer.rank,
+        }
+        for customer in customers
+    ]
+    results += [
+        {
+            "kind": "profile",
+            "label": profile.code,
+            "detail": " · ".join(filter(None, [profile.customer.full_name, profile.slug])),
+            "status": profile.status,
+            "url": f"/admin/profiles/{profile.pk}/",
+            "rank": profile.rank,
+        }
+        for profile in profiles
+    ]
+    results += [
+        {
+            "kind": "order",
+            "label": f"Order #{order.pk}",
+            "detail": " · ".join(filter(None, [order.customer.full_name, order.tracking_code])),
+            "status": order.status,
+            "url": f"/admin/orders/{order.pk}/",
+            "rank": order.rank,
+        }
+        for order in orders
+    ]
+    results.sort(key=lambda result: result["rank"], reverse=True)
+    return results[:limit]
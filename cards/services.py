@@ -1,16 +1,18 @@
-﻿import hashlib
-import secrets
+﻿import secrets
 from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.db import transaction
+from django.core.mail import EmailMessage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.crypto import salted_hmac
 from django.utils import timezone
 from django.utils.text import slugify
 
 from .constants import HOSTING_INCLUDED_YEARS, PACKAGES
-from .models import Customer, Profile, Order, Payment, EditLog
+from .models import Customer, Profile, ProfileCode, Order, Payment, EditLog
+from .useragents import classify_user_agent
 
 DEFAULT_THEME = {
     "mode": "light",
@@ -25,14 +27,58 @@ def generate_profile_code(length=8):
     return "".join(secrets.choice(alphabet) for _ in range(length))
 
 
+def mint_profile_codes(count, claimed=False, batch_size=5000, attempts=5):
+    # Candidates are checked against profiles and the inventory in one query
+    # per batch. A batch that races a concurrent mint fails on the unique
+    # code as a whole (in its own savepoint) and is drawn again, so every
+    # code returned was inserted by this call.
+    minted = []
+    failures = 0
+    while len(minted) < count:
+        candidates = {generate_profile_code() for _ in range(min(count - len(minted), batch_size))}
+        taken = set(
+            Profile.objects.filter(code__in=candidates)
+            .values_list("code", flat=True)
+            .union(ProfileCode.objects.filter(code__in=candidates).values_list("code", flat=True))
+        )
+        fresh = sorted(candidates - taken)
+        claimed_at = timezone.now() if claimed else None
+        try:
+            with transaction.atomic():
+                ProfileCode.objects.bulk_create([ProfileCode(code=code, claimed_at=claimed_at) for code in fresh])
+        except IntegrityError:
+            failures += 1
+            if failures >= attempts:
+                raise
+            continue
+        minted += fresh
+    return minted
+
+
+def claim_profile_codes(count=1):
+    # SKIP LOCKED lets concurrent checkouts take different rows instead of
+    # queueing on the same one. The claim commits or rolls back with the
+    # caller's transaction (finalize_payment, bulk imports).
+    with transaction.atomic():
+        rows = list(
+            ProfileCode.objects.select_for_update(skip_locked=True)
+            .filter(claimed_at__isnull=True)
+            .order_by("id")
+            .values_list("id", "code")[:count]
+        )
+        ProfileCode.objects.filter(id__in=[row_id for row_id, _ in rows]).update(claimed_at=timezone.now())
+    codes = [code for _, code in rows]
+    if len(codes) < count:
+        # Inventory ran dry (see mint_profile_codes): mint the rest claimed.
+        codes += mint_profile_codes(count - len(codes), claimed=True)
+    return codes
+
+
 def generate_unique_code():
-    while True:
-        code = generate_profile_code()
-        if not Profile.objects.filter(code=code).exists():
-            return code
+    return claim_profile_codes(1)[0]
 
 
-def generate_unique_slug(name):
+def slug_base(name):
     base = slugify(name) or "profile"
     base = base[:50]
     reserved = {
@@ -49,6 +95,11 @@ def generate_unique_slug(name):
     }
     if base in reserved:
         base = f"{base}-card"
+    return base
+
+
+def generate_unique_slug(name):
+    base = slug_base(name)
     slug = base
     suffix = 1
     while Profile.objects.filter(slug=slug).exists():
@@ -80,10 +131,36 @@ def build_content(data):
     }
 
 
+def build_vcard(profile):
+    content = profile.content_json or {}
+    full_name = content.get("full_name", "")
+    phone = content.get("phone", "")
+    email = content.get("email", "")
+    website = content.get("website", "")
+
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"FN:{full_name}",
+    ]
+    if phone:
+        lines.append(f"TEL;TYPE=CELL:{phone}")
+    if email:
+        lines.append(f"EMAIL:{email}")
+    if website:
+        lines.append(f"URL:{website}")
+    lines.append("END:VCARD")
+    return "\r\n".join(lines)
+
+
 def card_quantity_for_package(package_key):
     return PACKAGES.get(package_key, {}).get("card_quantity", 3)
 
 
+def analytics_level_for_package(package_key):
+    return PACKAGES.get(package_key, {}).get("analytics", "none")
+
+
 def edits_limit_for_package(package_key):
     return PACKAGES.get(package_key, {}).get("edits_included")
 
@@ -92,11 +169,16 @@ def edits_remaining(profile):
     limit = edits_limit_for_package(profile.customer.package)
     if limit is None:
         return None
-    used = EditLog.objects.filter(profile=profile).count()
-    remaining = max(limit - used, 0)
+    remaining = max(limit - profile.edits_used, 0)
     return remaining
 
 
+def record_edit(profile, made_by, edit_type, summary):
+    with transaction.atomic():
+        EditLog.objects.create(profile=profile, made_by=made_by, edit_type=edit_type, summary=summary)
+        Profile.objects.filter(pk=profile.pk).update(edits_used=F("edits_used") + 1)
+
+
 def get_client_ip(request):
     forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
     if forwarded:
@@ -104,24 +186,20 @@ def get_client_ip(request):
     return request.META.get("REMOTE_ADDR", "")
 
 
-def hash_ip(ip_address):
-    return hashlib.sha256(ip_address.encode("utf-8")).hexdigest() if ip_address else ""
+def hash_ip(ip_address, day=None):
+    # Keyed with a salt that rotates every VISITOR_HASH_ROTATION_DAYS, so stored
+    # hashes cannot be brute-forced back to an address or joined across periods.
+    if not ip_address:
+        return ""
+    period = (day or timezone.localdate()).toordinal() // settings.VISITOR_HASH_ROTATION_DAYS
+    return salted_hmac(f"cards.ip-hash.{period}", ip_address, algorithm="sha256").hexdigest()
 
 
 def detect_device_type(user_agent):
-    if not user_agent:
-        return "unknown"
-    agent = user_agent.lower()
-    if "mobile" in agent or "android" in agent or "iphone" in agent:
-        return "mobile"
-    if "ipad" in agent or "tablet" in agent:
-        return "tablet"
-    return "desktop"
+    return classify_user_agent(user_agent).device
 
 
-def _send_client_welcome_email(customer, username, raw_password):
-    if not customer.email or not raw_password:
-        return
+def client_welcome_email(customer, username, raw_password):
     login_url = f"{settings.SITE_URL}/client/login/"
     subject = "Your ThinkTech BizCards portal login"
     message = (
@@ -132,7 +210,13 @@ def _send_client_welcome_email(customer, username, raw_password):
         f"Temporary password: {raw_password}\n\n"
         "Please change your password after logging in."
     )
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [customer.email], fail_silently=True)
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [customer.email])
+
+
+def _send_client_welcome_email(customer, username, raw_password):
+    if not customer.email or not raw_password:
+        return
+    client_welcome_email(customer, username, raw_password).send(fail_silently=True)
 
 
 def create_customer_user(customer, send_email=True):
@@ -162,6 +246,8 @@ def create_customer_user(customer, send_email=True):
 
 @transaction.atomic
 def finalize_payment(payment):
+    from .qr import enqueue_prerender_qr  # cards.qr imports this module
+
     if payment.status == "success" and payment.order_id and payment.customer_id:
         return payment.order
 
@@ -195,6 +281,7 @@ def finalize_payment(payment):
         status="live",
         hosting_expires_at=timezone.now() + timedelta(days=365 * HOSTING_INCLUDED_YEARS),
     )
+    transaction.on_commit(lambda: enqueue_prerender_qr(profile))
 
     order = Order.objects.create(
         customer=customer,
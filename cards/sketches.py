@@ -0,0 +1,129 @@
+import logging
+import math
+import zlib
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .buffers import WriteBehindBuffer
+from .models import VisitorSketch
+
+HLL_PRECISION = 11
+SKETCH_FLUSH_INTERVAL = 10
+logger = logging.getLogger(__name__)
+
+
+class HyperLogLog:
+    def __init__(self, registers=None, precision=HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    @classmethod
+    def from_bytes(cls, payload):
+        return cls(zlib.decompress(bytes(payload)) if payload else None)
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers), 6)
+
+    def add(self, value):
+        index = value >> (64 - self.precision)
+        remainder = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(max(pair) for pair in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            return round(self.size * math.log(self.size / zeros))
+        return round(estimate)
+
+
+def visitor_hash(ip_address, user_agent):
+    # Stable across days so daily sketches can be merged; the registers only
+    # keep leading-zero counts, so nothing about the visitor is recoverable.
+    # The user agent is mixed in because a whole event often shares one Wi-Fi IP.
+    digest = salted_hmac(
+        "cards.visitor-sketch", f"{ip_address}|{user_agent}", algorithm="sha256"
+    ).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class SketchBuffer(WriteBehindBuffer):
+    flush_interval = SKETCH_FLUSH_INTERVAL
+    thread_name = "visitor-sketches"
+
+    def add(self, profile_id, day, value):
+        self._ensure_worker()
+        with self._lock:
+            sketch = self._pending.get((profile_id, day))
+            if sketch is None:
+                sketch = self._pending[(profile_id, day)] = HyperLogLog()
+            sketch.add(value)
+
+    def _reset(self):
+        self._pending = {}
+
+    def _take(self):
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def _write(self, pending):
+        failed = {}
+        for (profile_id, day), sketch in pending.items():
+            try:
+                merge_sketch(profile_id, day, sketch)
+            except Exception:
+                logger.exception("Could not merge the visitor sketch for profile %s on %s", profile_id, day)
+                failed[(profile_id, day)] = sketch
+        return failed
+
+    def _requeue(self, failed):
+        # Merging is a max, so folding in visitors added meanwhile loses nothing.
+        for key, sketch in failed.items():
+            newer = self._pending.get(key)
+            self._pending[key] = sketch.merge(newer) if newer else sketch
+
+
+@transaction.atomic
+def merge_sketch(profile_id, day, sketch):
+    # Merging is a register-wise max, so replaying a flush never double counts.
+    row, created = VisitorSketch.objects.select_for_update().get_or_create(
+        profile_id=profile_id,
+        day=day,
+        defaults={"registers": sketch.to_bytes()},
+    )
+    if created:
+        return
+    row.registers = HyperLogLog.from_bytes(row.registers).merge(sketch).to_bytes()
+    row.save(update_fields=["registers", "updated_at"])
+
+
+sketch_buffer = SketchBuffer()
+
+
+def record_visitor(profile_id, ip_address, user_agent):
+    sketch_buffer.add(profile_id, timezone.localdate(), visitor_hash(ip_address, user_agent))
+
+
+def unique_visitors(profile_id, start, end=None):
+    end = end or timezone.localdate()
+    merged = HyperLogLog()
+    rows = VisitorSketch.objects.filter(profile_id=profile_id, day__gte=start, day__lte=end)
+    for registers in rows.values_list("registers", flat=True):
+        merged.merge(HyperLogLog.from_bytes(registers))
+    return merged.count()
+
+
+def unique_visitors_last(profile_id, days):
+    today = timezone.localdate()
+    return unique_visitors(profile_id, today - timedelta(days=days - 1), today)
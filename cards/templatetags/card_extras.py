@@ -1,4 +1,5 @@
 ﻿from django import template
+from django.core.files.storage import default_storage
 
 from cards.services import edits_remaining
 
@@ -11,3 +12,28 @@ def edits_left(profile):
     if remaining is None:
         return "Unlimited"
     return str(remaining)
+
+
+def _srcset(widths):
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in sorted(widths.items(), key=lambda item: int(item[0]))
+    )
+
+
+@register.inclusion_tag("profiles/includes/logo_picture.html")
+def logo_picture(profile, rendition, sizes, css_class="", alt=""):
+    variants = (profile.logo_variants or {}).get(rendition) or {}
+    webp = variants.get("webp") or {}
+    jpeg = variants.get("jpeg") or {}
+    fallback = profile.logo.url
+    if jpeg:
+        fallback = default_storage.url(jpeg[min(jpeg, key=int)])
+    return {
+        "src": fallback,
+        "webp_srcset": _srcset(webp),
+        "jpeg_srcset": _srcset(jpeg),
+        "sizes": sizes,
+        "css_class": css_class,
+        "alt": alt,
+    }
@@ -9,7 +9,9 @@ urlpatterns = [
     path("order/success/<str:reference>/", views_public.order_success, name="order-success"),
     path("c/<str:code>/qr", views_public.profile_qr, name="profile-qr"),
     path("c/<str:code>/card.vcf", views_public.profile_vcard, name="profile-vcard"),
+    path("c/<str:code>/visit", views_public.profile_visit, name="profile-visit"),
     path("c/<str:code>/action", views_public.profile_action, name="profile-action"),
+    path("c/<str:code>/actions", views_public.profile_actions_batch, name="profile-actions"),
     path("c/<str:code>/", views_public.profile_by_code, name="profile-by-code"),
     path("<slug:slug>/", views_public.profile_by_slug, name="profile-by-slug"),
 ]
@@ -0,0 +1,96 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+# Link-preview fetchers run before a human ever sees the card; checked before
+# BOT_PATTERN because several of them (Twitterbot, LinkedInBot) also say "bot".
+# Only the fetchers' own tokens are listed: Pinterest, Viber and Tumblr also
+# put their name in the user agent of their in-app browsers.
+UNFURLER_PATTERN = re.compile(
+    r"facebookexternalhit|facebot|whatsapp/|slackbot|slack-imgproxy|twitterbot|linkedinbot|"
+    r"telegrambot|discordbot|skypeuripreview|microsoftpreview|pinterestbot|pinterest/0\.|redditbot|"
+    r"embedly|iframely|vkshare|google-pagerenderer|bitlybot|tumblr/\d|link preview"
+)
+# "bot" only counts as its own word, before a version or in a "compatible;"
+# token, so phone models such as "Cubot" are not caught.
+BOT_PATTERN = re.compile(
+    r"\bbot\b|[a-z]bot[/-]|compatible;[^;)]*bot|crawl|spider|slurp|mediapartners|headlesschrome|"
+    r"lighthouse|pingdom|uptime|statuscake|site24x7|newrelicpinger|datadog|monitor/|curl/|wget/|"
+    r"python-requests|python-urllib|aiohttp|httpx|go-http-client|java/|okhttp|libwww|scrapy|"
+    r"node-fetch|axios|postman|phantomjs|bingpreview|google web preview"
+)
+IN_APP_PATTERNS = (
+    ("facebook", re.compile(r"fban|fbav|fb_iab")),
+    ("instagram", re.compile(r"instagram")),
+    ("tiktok", re.compile(r"musical_ly|bytedancewebview|tiktok")),
+    ("snapchat", re.compile(r"snapchat")),
+    ("linkedin", re.compile(r"linkedinapp")),
+    ("twitter", re.compile(r"twitter")),
+    ("pinterest", re.compile(r"pinterest")),
+    ("viber", re.compile(r"viber")),
+    ("tumblr", re.compile(r"tumblr")),
+    ("line", re.compile(r"\bline/")),
+    ("webview", re.compile(r"; wv\)")),
+)
+OS_PATTERNS = (
+    ("ios", re.compile(r"iphone|ipad|ipod")),
+    ("android", re.compile(r"android")),
+    ("windows", re.compile(r"windows")),
+    ("chromeos", re.compile(r"cros")),
+    ("macos", re.compile(r"mac os x|macintosh")),
+    ("linux", re.compile(r"linux")),
+)
+BROWSER_PATTERNS = (
+    ("edge", re.compile(r"edg/|edga/|edgios/")),
+    ("opera", re.compile(r"opr/|opera")),
+    ("samsung", re.compile(r"samsungbrowser")),
+    ("firefox", re.compile(r"firefox|fxios")),
+    ("chrome", re.compile(r"chrome|crios")),
+    ("safari", re.compile(r"safari")),
+)
+
+
+class UserAgentInfo(NamedTuple):
+    kind: str
+    device: str
+    os: str
+    browser: str
+    in_app: str
+
+    @property
+    def is_bot(self):
+        return self.kind != "browser"
+
+
+def _first_match(patterns, agent):
+    for name, pattern in patterns:
+        if pattern.search(agent):
+            return name
+    return ""
+
+
+def _device(agent, os_name):
+    if "ipad" in agent or "tablet" in agent or (os_name == "android" and "mobile" not in agent):
+        return "tablet"
+    if "mobile" in agent or os_name in {"ios", "android"}:
+        return "mobile"
+    return "desktop"
+
+
+@lru_cache(maxsize=4096)
+def classify_user_agent(user_agent):
+    if not user_agent:
+        return UserAgentInfo("browser", "unknown", "", "", "")
+    agent = user_agent.lower()
+    if UNFURLER_PATTERN.search(agent):
+        return UserAgentInfo("unfurler", "bot", "", "", "")
+    if BOT_PATTERN.search(agent):
+        return UserAgentInfo("bot", "bot", "", "", "")
+    os_name = _first_match(OS_PATTERNS, agent)
+    return UserAgentInfo(
+        "browser",
+        _device(agent, os_name),
+        os_name,
+        _first_match(BROWSER_PATTERNS, agent),
+        _first_match(IN_APP_PATTERNS, agent),
+    )
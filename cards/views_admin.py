@@ -1,19 +1,45 @@
 ﻿from datetime import timedelta
+from urllib.parse import urlencode
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+from django.db.models import Count, Q
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.views import View
 from django.views.generic import DetailView, ListView, TemplateView
 
-from .constants import HOSTING_PRICE_YEARLY, PACKAGES
-from .forms import AdminLoginForm, OrderStatusForm, ProfileEditForm
-from .models import Action, Customer, EditLog, Order, Profile, Visit
-from .services import edits_remaining
+from .bulk_orders import (
+    BulkOrderError,
+    background_imports_available,
+    import_job,
+    read_order_rows,
+    rows_per_second,
+    start_import,
+    validate_rows,
+)
+from .caching import get_or_revalidate
+from .constants import (
+    CUSTOMER_STATUS_CHOICES,
+    HOSTING_PRICE_YEARLY,
+    ORDER_STATUS_CHOICES,
+    PACKAGE_CHOICES,
+    PACKAGES,
+    PROFILE_STATUS_CHOICES,
+)
+from .counters import event_totals
+from .exports import export_response
+from .forms import AdminLoginForm, BulkOrderUploadForm, OpsEventExportForm, OrderStatusForm, ProfileEditForm
+from .models import Action, Customer, Order, Profile, Visit
+from .pagination import keyset_page
+from .rollups import actions_by_type, as_rows, visits_by_day, visits_by_device
+from .search import search_ops
+from .services import edits_remaining, record_edit
+from .sketches import unique_visitors_last
+from .visits import bot_hits
 
 
 class AdminRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -39,45 +65,113 @@ class AdminLogoutView(LogoutView):
     pass
 
 
+DASHBOARD_CACHE_KEY = "ops-dashboard-counters"
+
+
+def dashboard_counters():
+    now = timezone.now()
+    last_7 = now - timedelta(days=7)
+    orders = Order.objects.aggregate(
+        paid=Count("id", filter=Q(status="paid")),
+        encoded=Count("id", filter=Q(status="encoded")),
+    )
+    profiles = Profile.objects.filter(hosting_expires_at__gte=now).aggregate(
+        live=Count("id", filter=Q(status="live")),
+        renewals_30d=Count("id", filter=Q(hosting_expires_at__lte=now + timedelta(days=30))),
+        renewals_7d=Count("id", filter=Q(hosting_expires_at__lte=now + timedelta(days=7))),
+    )
+    return {
+        "new_paid_orders": orders["paid"],
+        "orders_to_encode": orders["paid"],
+        "orders_to_ship": orders["encoded"],
+        "profiles_live": profiles["live"],
+        "renewals_30d": profiles["renewals_30d"],
+        "renewals_7d": profiles["renewals_7d"],
+        "visits_last_7d": Visit.objects.filter(visited_at__gte=last_7).count(),
+        "actions_last_7d": Action.objects.filter(created_at__gte=last_7).count(),
+    }
+
+
 class AdminDashboardView(AdminRequiredMixin, AdminNavMixin, TemplateView):
     template_name = "ops/dashboard.html"
     active_nav = "dashboard"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
-        last_7 = now - timedelta(days=7)
         context.update(
-            {
-                "new_paid_orders": Order.objects.filter(status="paid").count(),
-                "orders_to_encode": Order.objects.filter(status="paid").count(),
-                "orders_to_ship": Order.objects.filter(status="encoded").count(),
-                "profiles_live": Profile.objects.filter(
-                    status="live", hosting_expires_at__gte=now
-                ).count(),
-                "renewals_30d": Profile.objects.filter(
-                    hosting_expires_at__lte=now + timedelta(days=30),
-                    hosting_expires_at__gte=now,
-                ).count(),
-                "renewals_7d": Profile.objects.filter(
-                    hosting_expires_at__lte=now + timedelta(days=7),
-                    hosting_expires_at__gte=now,
-                ).count(),
-                "visits_last_7d": Visit.objects.filter(visited_at__gte=last_7).count(),
-                "actions_last_7d": Action.objects.filter(created_at__gte=last_7).count(),
-            }
+            get_or_revalidate(
+                DASHBOARD_CACHE_KEY,
+                dashboard_counters,
+                settings.DASHBOARD_CACHE_TIMEOUT,
+                settings.DASHBOARD_CACHE_STALE,
+            )
+        )
+        return context
+
+
+class KeysetListMixin:
+    page_size = 50
+    # query parameter -> (label, lookup, choices)
+    list_filters = {}
+
+    def get_active_filters(self):
+        active = {}
+        for param, (_, _, choices) in self.list_filters.items():
+            value = self.request.GET.get(param, "")
+            if value in dict(choices):
+                active[param] = value
+        return active
+
+    def get_queryset(self):
+        queryset = self.get_list_queryset()
+        for param, value in self.get_active_filters().items():
+            queryset = queryset.filter(**{self.list_filters[param][1]: value})
+        return queryset
+
+    def _page_url(self, active, **cursor):
+        return "?" + urlencode({**active, **cursor})
+
+    def get_context_data(self, **kwargs):
+        page = keyset_page(
+            self.object_list,
+            after=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+            size=self.page_size,
         )
+        context = super().get_context_data(object_list=page["rows"], **kwargs)
+        active = self.get_active_filters()
+        context["list_filters"] = [
+            {"param": param, "label": label, "choices": choices, "selected": active.get(param, "")}
+            for param, (label, _, choices) in self.list_filters.items()
+        ]
+        if page["newer_cursor"]:
+            context["newer_url"] = self._page_url(active, before=page["newer_cursor"])
+        if page["older_cursor"]:
+            context["older_url"] = self._page_url(active, after=page["older_cursor"])
         return context
 
 
-class CustomersListView(AdminRequiredMixin, AdminNavMixin, ListView):
+class CustomersListView(AdminRequiredMixin, AdminNavMixin, KeysetListMixin, ListView):
     template_name = "ops/customers_list.html"
     model = Customer
     context_object_name = "customers"
     active_nav = "customers"
-
-    def get_queryset(self):
-        return Customer.objects.select_related("profile").order_by("-created_at")
+    list_filters = {
+        "status": ("Status", "status", CUSTOMER_STATUS_CHOICES),
+        "package": ("Package", "package", PACKAGE_CHOICES),
+    }
+
+    def get_list_queryset(self):
+        return Customer.objects.select_related("profile").only(
+            "full_name",
+            "email",
+            "phone",
+            "package",
+            "status",
+            "created_at",
+            "profile__id",
+            "profile__hosting_expires_at",
+        )
 
 
 class CustomerDetailView(AdminRequiredMixin, AdminNavMixin, DetailView):
@@ -92,14 +186,25 @@ class CustomerDetailView(AdminRequiredMixin, AdminNavMixin, DetailView):
         return context
 
 
-class ProfilesListView(AdminRequiredMixin, AdminNavMixin, ListView):
+class ProfilesListView(AdminRequiredMixin, AdminNavMixin, KeysetListMixin, ListView):
     template_name = "ops/profiles_list.html"
     model = Profile
     context_object_name = "profiles"
     active_nav = "profiles"
-
-    def get_queryset(self):
-        return Profile.objects.select_related("customer").order_by("-created_at")
+    list_filters = {
+        "status": ("Status", "status", PROFILE_STATUS_CHOICES),
+        "package": ("Package", "customer__package", PACKAGE_CHOICES),
+    }
+
+    def get_list_queryset(self):
+        return Profile.objects.select_related("customer").only(
+            "code",
+            "template_key",
+            "status",
+            "hosting_expires_at",
+            "created_at",
+            "customer__full_name",
+        )
 
 
 class ProfileDetailView(AdminRequiredMixin, AdminNavMixin, DetailView):
@@ -108,6 +213,9 @@ class ProfileDetailView(AdminRequiredMixin, AdminNavMixin, DetailView):
     context_object_name = "profile"
     active_nav = "profiles"
 
+    def get_queryset(self):
+        return Profile.objects.select_related("customer")
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["edits_remaining"] = edits_remaining(self.object)
@@ -145,12 +253,7 @@ class ProfileEditView(AdminRequiredMixin, AdminNavMixin, View):
                 edit_type = "template"
             elif any(field in changed_fields for field in ["mode", "primary", "secondary", "accent"]):
                 edit_type = "theme"
-            EditLog.objects.create(
-                profile=profile,
-                made_by=request.user,
-                edit_type=edit_type,
-                summary="Updated profile settings",
-            )
+            record_edit(profile, request.user, edit_type, "Updated profile settings")
             messages.success(request, "Profile updated.")
             return redirect("admin-profile-detail", pk=profile.pk)
         return render(
@@ -166,14 +269,20 @@ class ProfileEditView(AdminRequiredMixin, AdminNavMixin, View):
         )
 
 
-class OrdersListView(AdminRequiredMixin, AdminNavMixin, ListView):
+class OrdersListView(AdminRequiredMixin, AdminNavMixin, KeysetListMixin, ListView):
     template_name = "ops/orders_list.html"
     model = Order
     context_object_name = "orders"
     active_nav = "orders"
-
-    def get_queryset(self):
-        return Order.objects.select_related("customer", "profile").order_by("-created_at")
+    list_filters = {
+        "status": ("Status", "status", ORDER_STATUS_CHOICES),
+        "package": ("Package", "package", PACKAGE_CHOICES),
+    }
+
+    def get_list_queryset(self):
+        return Order.objects.select_related("customer").only(
+            "package", "status", "created_at", "customer__full_name"
+        )
 
 
 class OrderDetailView(AdminRequiredMixin, AdminNavMixin, View):
@@ -220,22 +329,109 @@ class OrderDetailView(AdminRequiredMixin, AdminNavMixin, View):
         )
 
 
+class SearchView(AdminRequiredMixin, AdminNavMixin, TemplateView):
+    template_name = "ops/search.html"
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get("format") == "json":
+            return JsonResponse({"results": search_ops(request.GET.get("q", ""))})
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET.get("q", "").strip()
+        context["results"] = search_ops(context["query"])
+        return context
+
+
+class OrderImportView(AdminRequiredMixin, View):
+    template_name = "ops/order_import.html"
+    active_nav = "orders"
+
+    def get(self, request):
+        form = BulkOrderUploadForm()
+        return render(request, self.template_name, {"form": form, "active_nav": self.active_nav})
+
+    def post(self, request):
+        form = BulkOrderUploadForm(request.POST, request.FILES)
+        context = {"form": form, "active_nav": self.active_nav}
+        if not form.is_valid():
+            return render(request, self.template_name, context)
+        data = form.cleaned_data
+        defaults = {
+            key: data[key]
+            for key in ("package", "template_key", "shipping_name", "shipping_phone", "shipping_address")
+            if data[key]
+        }
+        upload = data["file"]
+        try:
+            valid, errors = validate_rows(read_order_rows(upload.file, upload.name), defaults)
+        except BulkOrderError as exc:
+            form.add_error("file", str(exc))
+            return render(request, self.template_name, context)
+        context.update({"valid_count": len(valid), "row_errors": errors})
+        if data["dry_run"] or not valid or (errors and not data["skip_invalid"]):
+            return render(request, self.template_name, context)
+        if not background_imports_available():
+            form.add_error(
+                None,
+                "Uploads need a shared cache (DJANGO_CACHE_URL) to track the import across workers. "
+                "Validate here, then run `python manage.py import_orders` on the server.",
+            )
+            return render(request, self.template_name, context)
+        job_id = start_import(valid, send_email=data["send_email"])
+        return redirect("admin-order-import-status", job_id=job_id)
+
+
+class OrderImportStatusView(AdminRequiredMixin, AdminNavMixin, TemplateView):
+    template_name = "ops/order_import_status.html"
+    active_nav = "orders"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        job = import_job(kwargs["job_id"])
+        context["job"] = job
+        if job:
+            context["rate"] = rows_per_second(job)
+        return context
+
+
 class AnalyticsView(AdminRequiredMixin, AdminNavMixin, TemplateView):
     template_name = "ops/analytics.html"
     active_nav = "analytics"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["total_visits"] = Visit.objects.count()
-        context["total_actions"] = Action.objects.count()
-        context["top_actions"] = (
-            Action.objects.values("action_type")
-            .annotate(total=Count("id"))
-            .order_by("-total")
-        )
+        total_visits, total_actions, by_type = event_totals()
+        context["total_visits"] = total_visits
+        context["total_actions"] = total_actions
+        context["top_actions"] = as_rows(by_type, "action_type", by_total=True)
         return context
 
 
+class EventExportView(AdminRequiredMixin, View):
+    template_name = "ops/export.html"
+    active_nav = "analytics"
+
+    def get(self, request):
+        form = OpsEventExportForm(request.GET or None)
+        if not form.is_valid():
+            return render(request, self.template_name, {"form": form, "active_nav": self.active_nav})
+        data = form.cleaned_data
+        parts = [data["kind"], timezone.localdate().isoformat()]
+        if data["profile"]:
+            parts.insert(0, request.GET["profile"].strip().upper())
+        return export_response(
+            data["kind"],
+            data["format"],
+            "-".join(parts),
+            compress=data["gzip"],
+            profile_id=data["profile"],
+            start=data["start"],
+            end=data["end"],
+        )
+
+
 class ProfileAnalyticsView(AdminRequiredMixin, AdminNavMixin, TemplateView):
     template_name = "ops/profile_analytics.html"
     active_nav = "analytics"
@@ -243,27 +439,20 @@ class ProfileAnalyticsView(AdminRequiredMixin, AdminNavMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         profile = get_object_or_404(Profile, pk=kwargs.get("pk"))
-        visits_qs = Visit.objects.filter(profile=profile)
-        actions_qs = Action.objects.filter(profile=profile)
-        visits_by_day = (
-            visits_qs.annotate(day=TruncDate("visited_at"))
-            .values("day")
-            .annotate(total=Count("id"))
-            .order_by("-day")
-        )
-        actions_breakdown = (
-            actions_qs.values("action_type")
-            .annotate(total=Count("id"))
-            .order_by("-total")
-        )
-        total_visits = visits_qs.count()
-        total_actions = actions_qs.count()
+        visits = visits_by_day(profile.pk)
+        actions = actions_by_type(profile.pk)
+        total_visits = sum(visits.values())
+        total_actions = sum(actions.values())
         conversion_rate = (total_actions / total_visits) if total_visits else 0
         context.update(
             {
                 "profile": profile,
-                "visits_by_day": visits_by_day,
-                "actions_breakdown": actions_breakdown,
+                "bot_hits_today": bot_hits(profile.pk, timezone.localdate()),
+                "unique_visitors_7": unique_visitors_last(profile.pk, 7),
+                "unique_visitors_30": unique_visitors_last(profile.pk, 30),
+                "visits_by_day": as_rows(visits, "day")[::-1],
+                "visits_by_device": as_rows(visits_by_device(profile.pk), "device_type", by_total=True),
+                "actions_breakdown": as_rows(actions, "action_type", by_total=True),
                 "total_visits": total_visits,
                 "total_actions": total_actions,
                 "conversion_rate": conversion_rate,
@@ -298,7 +487,7 @@ class RenewalExtendView(AdminRequiredMixin, View):
         base = profile.hosting_expires_at if profile.hosting_expires_at > now else now
         profile.hosting_expires_at = base + timedelta(days=365)
         profile.status = "live"
-        profile.save()
+        profile.save(update_fields=["hosting_expires_at", "status", "updated_at"])
         messages.success(request, "Hosting extended by 1 year.")
         return redirect("admin-renewals")
 
@@ -1,23 +1,42 @@
-﻿from datetime import timedelta
-
-from django.contrib import messages
+﻿from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
-from django.db.models import Count
-from django.db.models.functions import TruncDate
 from django.shortcuts import redirect, render
 from django.utils import timezone
 from django.views import View
 from django.views.generic import TemplateView
 
-from .forms import ClientLoginForm, ClientPasswordChangeForm, ClientProfileForm
-from .models import Action, Profile, Visit
+from .caching import get_profile_stats
+from .exports import export_response
+from .forms import ClientLoginForm, ClientPasswordChangeForm, ClientProfileForm, EventExportForm
+from .models import Customer, Profile
+from .rollups import as_rows, profile_summary
+from .services import analytics_level_for_package
+from .sketches import unique_visitors_last
+
+
+def dashboard_stats(profile_id):
+    summary = profile_summary(profile_id, recent_days=7)
+    return {
+        "total_visits": summary["total_visits"],
+        "total_actions": summary["total_actions"],
+        "visits_last_7": summary["visits_recent"],
+        "unique_visitors_7": unique_visitors_last(profile_id, 7),
+        "actions_last_7": summary["actions_recent"],
+        "visits_by_day": as_rows(summary["visits_by_day"], "day"),
+        "actions_by_type": as_rows(summary["actions_by_type"], "action_type", by_total=True),
+    }
 
 
 class ClientRequiredMixin(LoginRequiredMixin):
     login_url = "/client/login/"
 
     def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            # Customer and profile in one query instead of two lazy lookups.
+            customer = Customer.objects.select_related("profile").filter(user=request.user).first()
+            if customer:
+                request.user.customer = customer
         if not getattr(request.user, "customer", None):
             return redirect("client-login")
         return super().dispatch(request, *args, **kwargs)
@@ -52,32 +71,10 @@ class ClientDashboardView(ClientRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         customer = self.request.user.customer
         profile = customer.profile
-        now = timezone.now()
-        last_7 = now - timedelta(days=7)
-        visits_qs = Visit.objects.filter(profile=profile)
-        actions_qs = Action.objects.filter(profile=profile)
-        visits_by_day = (
-            visits_qs.filter(visited_at__gte=last_7)
-            .annotate(day=TruncDate("visited_at"))
-            .values("day")
-            .annotate(total=Count("id"))
-            .order_by("day")
-        )
-        actions_by_type = (
-            actions_qs.values("action_type").annotate(total=Count("id")).order_by("-total")
-        )
-        context.update(
-            {
-                "customer": customer,
-                "profile": profile,
-                "total_visits": visits_qs.count(),
-                "total_actions": actions_qs.count(),
-                "visits_last_7": visits_qs.filter(visited_at__gte=last_7).count(),
-                "actions_last_7": actions_qs.filter(created_at__gte=last_7).count(),
-                "visits_by_day": visits_by_day,
-                "actions_by_type": actions_by_type,
-            }
-        )
+        context.update(get_profile_stats(profile.pk, lambda: dashboard_stats(profile.pk)))
+        context["customer"] = customer
+        context["profile"] = profile
+        context["can_export"] = analytics_level_for_package(customer.package) == "advanced"
         return context
 
 
@@ -117,6 +114,30 @@ class ClientProfileEditView(ClientRequiredMixin, View):
         )
 
 
+class ClientExportView(ClientRequiredMixin, View):
+    template_name = "client/export.html"
+
+    def get(self, request):
+        customer = request.user.customer
+        if analytics_level_for_package(customer.package) != "advanced":
+            messages.error(request, "Raw data exports are included with the Premium package.")
+            return redirect("client-dashboard")
+        profile = customer.profile
+        form = EventExportForm(request.GET or None)
+        if not form.is_valid():
+            return render(request, self.template_name, {"form": form, "profile": profile})
+        data = form.cleaned_data
+        return export_response(
+            data["kind"],
+            data["format"],
+            f"{profile.code}-{data['kind']}-{timezone.localdate().isoformat()}",
+            compress=data["gzip"],
+            profile_id=profile.pk,
+            start=data["start"],
+            end=data["end"],
+        )
+
+
 class ClientPasswordChangeView(ClientRequiredMixin, PasswordChangeView):
     template_name = "client/password_change.html"
     form_class = ClientPasswordChangeForm
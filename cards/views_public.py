@@ -1,20 +1,40 @@
-import io
+﻿import base64
+import json
 import uuid
 
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_http_methods, require_POST
 from django.views.generic import FormView, TemplateView
-import qrcode
-
 
+from .caching import (
+    VISIT_TOKEN_PLACEHOLDER,
+    get_profile_page,
+    invalidate_profile_stats,
+    profile_page_etag,
+    render_with_visit,
+    set_profile_page,
+)
 from .constants import PACKAGES
+from .counters import count_actions
 from .forms import OrderCreateForm
-from .models import Action, Payment, Profile, Visit
-from .services import detect_device_type, finalize_payment, get_client_ip, hash_ip
+from .models import Action, Payment, Profile
+from .qr import QR_FORMATS, QRPayloadError, get_qr_image, qr_cache_key, qr_options, qr_payload
+from .resolver import profile_resolver
+from .services import build_vcard, finalize_payment
+from .visits import log_visit, read_visit_token, sign_visit
+
+MAX_ACTION_BATCH = 50
+TRACKING_PIXEL = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+ACTION_TYPE_MAX_LENGTH = Action._meta.get_field("action_type").max_length
+ACTION_VALUE_MAX_LENGTH = Action._meta.get_field("action_value").max_length
 
 
 class HomeView(TemplateView):
@@ -77,41 +97,16 @@ def order_success(request, reference):
     )
 
 
-def _build_vcard(profile):
-    content = profile.content_json or {}
-    full_name = content.get("full_name", "")
-    phone = content.get("phone", "")
-    email = content.get("email", "")
-    website = content.get("website", "")
-
-    lines = [
-        "BEGIN:VCARD",
-        "VERSION:3.0",
-        f"FN:{full_name}",
-    ]
-    if phone:
-        lines.append(f"TEL;TYPE=CELL:{phone}")
-    if email:
-        lines.append(f"EMAIL:{email}")
-    if website:
-        lines.append(f"URL:{website}")
-    lines.append("END:VCARD")
-    return "\r\n".join(lines)
-
-
-def _build_qr_png(data):
-    qr = qrcode.QRCode(version=1, box_size=6, border=2)
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    return buffer.getvalue()
+def _resolve_profile_or_404(lookup, value):
+    profile = profile_resolver.resolve(lookup, value)
+    if profile is None:
+        raise Http404("No profile matches the given query.")
+    return profile
 
 
 def profile_vcard(request, code):
-    profile = get_object_or_404(Profile, code=code)
-    vcard = _build_vcard(profile)
+    profile = _resolve_profile_or_404("code", code)
+    vcard = build_vcard(profile)
     filename = profile.slug or profile.code
     response = HttpResponse(vcard, content_type="text/vcard; charset=utf-8")
     response["Content-Disposition"] = f"attachment; filename=\"{filename}.vcf\""
@@ -119,91 +114,179 @@ def profile_vcard(request, code):
 
 
 def profile_qr(request, code):
-    profile = get_object_or_404(Profile, code=code)
+    profile = _resolve_profile_or_404("code", code)
     qr_type = (request.GET.get("type") or "vcard").lower()
-    content = profile.content_json or {}
-    if qr_type == "call":
-        phone = content.get("phone") or content.get("whatsapp")
-        if not phone:
-            return HttpResponseBadRequest("phone-missing")
-        data = f"tel:{phone}"
-    elif qr_type in {"vcard", "contact", "save"}:
-        data = _build_vcard(profile)
-    elif qr_type == "url":
-        data = request.build_absolute_uri(reverse("profile-by-code", args=[profile.code]))
-    else:
-        return HttpResponseBadRequest("invalid-type")
-
-    png = _build_qr_png(data)
-    response = HttpResponse(png, content_type="image/png")
-    response["Cache-Control"] = "no-store"
+    try:
+        # SITE_URL, not the request's Host: Host is client-controlled, and
+        # pre-rendered images are keyed on SITE_URL too.
+        data = qr_payload(profile, qr_type, settings.SITE_URL)
+        options = qr_options(
+            fmt=request.GET.get("format"),
+            size=request.GET.get("size"),
+            error_correction=request.GET.get("ec"),
+        )
+    except QRPayloadError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    etag = f'"{qr_cache_key(data, options)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        _, image = get_qr_image(data, options)
+        response = HttpResponse(image, content_type=QR_FORMATS[options["format"]])
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={settings.QR_HTTP_MAX_AGE}"
     return response
 
 
-def _log_visit(request, profile):
-    ip = get_client_ip(request)
-    user_agent = request.META.get("HTTP_USER_AGENT", "")
-    return Visit.objects.create(
-        profile=profile,
-        visited_at=timezone.now(),
-        ip_hash=hash_ip(ip),
-        user_agent=user_agent,
-        referrer=request.META.get("HTTP_REFERER", ""),
-        utm_source=request.GET.get("utm_source"),
-        utm_medium=request.GET.get("utm_medium"),
-        utm_campaign=request.GET.get("utm_campaign"),
-        utm_term=request.GET.get("utm_term"),
-        utm_content=request.GET.get("utm_content"),
-        device_type=detect_device_type(user_agent),
-    )
-
-
 def _render_profile(request, profile):
     if not profile.is_active:
         return render(request, "profiles/inactive.html", {"profile": profile})
 
-    visit = _log_visit(request, profile)
-    return render(
-        request,
+    html = render_to_string(
         "profiles/profile.html",
         {
             "profile": profile,
             "content": profile.content_json or {},
             "theme": profile.theme_json or {},
-            "visit_id": visit.id,
-            "action_url": reverse("profile-action", args=[profile.code]),
+            "visit_token": VISIT_TOKEN_PLACEHOLDER,
+            "visit_url": reverse("profile-visit", args=[profile.code]),
+            "visit_beacon": settings.PROFILE_HTTP_CACHING,
+            "actions_url": reverse("profile-actions", args=[profile.code]),
             "vcard_url": reverse("profile-vcard", args=[profile.code]),
         },
     )
+    entry = set_profile_page(profile, html)
+    return _profile_response(request, entry)
+
+
+def _profile_response(request, entry):
+    if not settings.PROFILE_HTTP_CACHING:
+        visit_id = log_visit(request, entry["profile_id"])
+        return HttpResponse(render_with_visit(entry["html"], sign_visit(entry["profile_id"], visit_id)))
+
+    # The visit is recorded by the page's beacon, so the HTML itself is the
+    # same for every request and can be revalidated or served by a proxy.
+    etag = profile_page_etag(entry)
+    last_modified = int(entry["updated_at"].timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(render_with_visit(entry["html"], ""))
+    remaining = int((entry["expires_at"] - timezone.now()).total_seconds())
+    max_age = max(min(settings.PROFILE_HTTP_MAX_AGE, remaining), 0)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = f"public, max-age={max_age}"
+    return response
 
 
-def profile_by_code(request, code):
-    profile = get_object_or_404(Profile, code=code)
+def _serve_profile(request, lookup, value):
+    entry = get_profile_page(lookup, value)
+    if entry:
+        return _profile_response(request, entry)
+    profile = _resolve_profile_or_404(lookup, value)
     return _render_profile(request, profile)
 
 
+def profile_by_code(request, code):
+    return _serve_profile(request, "code", code)
+
+
 def profile_by_slug(request, slug):
-    profile = get_object_or_404(Profile, slug=slug)
-    return _render_profile(request, profile)
+    return _serve_profile(request, "slug", slug)
+
+
+def _active_profile_id(code):
+    # Pages are only cached while the profile is active and suspensions drop
+    # them, so a cached page answers without a query.
+    entry = get_profile_page("code", code)
+    if entry:
+        return entry["profile_id"]
+    profile = profile_resolver.resolve("code", code)
+    return profile.pk if profile and profile.is_active else None
 
 
 @csrf_exempt
-@require_POST
-def profile_action(request, code):
+@require_http_methods(["GET", "POST"])
+def profile_visit(request, code):
+    # Suspended and expired cards are not counted.
+    profile_id = _active_profile_id(code)
+    if profile_id is None:
+        raise Http404("No profile matches the given query.")
+    referrer = request.POST.get("referrer") if request.method == "POST" else None
+    visit_id = log_visit(request, profile_id, referrer=referrer)
+    if request.method == "GET":
+        response = HttpResponse(TRACKING_PIXEL, content_type="image/gif")
+    else:
+        response = JsonResponse({"visit_token": sign_visit(profile_id, visit_id)})
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+def _action_target(code, token):
+    claims = read_visit_token(token)
+    if claims and profile_resolver.profile_id("code", code) == claims[0]:
+        return claims
     profile = get_object_or_404(Profile, code=code)
     if not profile.is_active:
+        return None
+    return profile.pk, None
+
+
+@csrf_exempt
+@require_POST
+def profile_action(request, code):
+    target = _action_target(code, request.POST.get("visit_token"))
+    if target is None:
         return JsonResponse({"ok": False, "error": "inactive"}, status=400)
+    profile_id, visit_id = target
     action_type = request.POST.get("action_type")
     action_value = request.POST.get("action_value", "")
-    visit_id = request.POST.get("visit_id")
-    visit = None
-    if visit_id:
-        visit = Visit.objects.filter(id=visit_id, profile=profile).first()
     if action_type:
         Action.objects.create(
-            profile=profile,
-            visit=visit,
+            profile_id=profile_id,
+            visit_id=visit_id,
             action_type=action_type,
             action_value=action_value,
         )
+        count_actions([action_type])
+        invalidate_profile_stats([profile_id])
     return JsonResponse({"ok": True})
+
+
+def _parse_action_batch(body):
+    payload = json.loads(body or b"{}")
+    if not isinstance(payload, dict) or not isinstance(payload.get("events"), list):
+        raise ValueError("events must be a list")
+    events = []
+    for event in payload["events"][:MAX_ACTION_BATCH]:
+        if not isinstance(event, dict):
+            continue
+        action_type = event.get("action_type")
+        if not isinstance(action_type, str) or not action_type.strip():
+            continue
+        action_value = event.get("action_value") or ""
+        events.append((action_type.strip()[:ACTION_TYPE_MAX_LENGTH], str(action_value)[:ACTION_VALUE_MAX_LENGTH]))
+    return payload.get("visit_token"), events
+
+
+@csrf_exempt
+@require_POST
+def profile_actions_batch(request, code):
+    try:
+        visit_token, events = _parse_action_batch(request.body)
+    except ValueError:
+        return HttpResponseBadRequest("invalid-payload")
+    target = _action_target(code, visit_token)
+    if target is None:
+        return JsonResponse({"ok": False, "error": "inactive"}, status=400)
+    profile_id, visit_id = target
+    if events:
+        Action.objects.bulk_create(
+            [
+                Action(profile_id=profile_id, visit_id=visit_id, action_type=action_type, action_value=action_value)
+                for action_type, action_value in events
+            ]
+        )
+        count_actions([action_type for action_type, _ in events])
+        invalidate_profile_stats([profile_id])
+    return HttpResponse(status=204)
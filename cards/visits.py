@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .buffers import WriteBehindBuffer
+from .caching import invalidate_profile_stats
+from .counters import count_visit
+from .models import Visit
+from .services import detect_device_type, get_client_ip, hash_ip
+from .sketches import record_visitor
+from .useragents import classify_user_agent
+
+VISIT_TOKEN_SALT = "cards.visit-token"
+BOT_HIT_KINDS = ("bot", "unfurler")
+BOT_HIT_TIMEOUT = 60 * 60 * 24 * 8
+logger = logging.getLogger(__name__)
+VISIT_FIELDS = (
+    "id",
+    "profile_id",
+    "visited_at",
+    "ip_hash",
+    "user_agent",
+    "referrer",
+    "utm_source",
+    "utm_medium",
+    "utm_campaign",
+    "utm_term",
+    "utm_content",
+    "device_type",
+)
+
+
+def build_visit_row(request, profile_id, referrer=None):
+    ip = get_client_ip(request)
+    user_agent = request.META.get("HTTP_USER_AGENT", "")
+    return {
+        "id": None,
+        "profile_id": profile_id,
+        "visited_at": timezone.now(),
+        "ip_hash": hash_ip(ip),
+        "user_agent": user_agent,
+        "referrer": request.META.get("HTTP_REFERER", "") if referrer is None else referrer,
+        "utm_source": request.GET.get("utm_source"),
+        "utm_medium": request.GET.get("utm_medium"),
+        "utm_campaign": request.GET.get("utm_campaign"),
+        "utm_term": request.GET.get("utm_term"),
+        "utm_content": request.GET.get("utm_content"),
+        "device_type": detect_device_type(user_agent),
+    }
+
+
+class VisitIdAllocator:
+    # Hands out visit ids from blocks reserved on the table's sequence, so a
+    # buffered visit has its final primary key before it is written.
+
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        if connection.vendor != "postgresql":
+            return []
+        table = Visit._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [table, self.block_size],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def next_id(self):
+        with self._lock:
+            if not self._ids:
+                try:
+                    self._ids = self._reserve()
+                except DatabaseError:
+                    return None
+            return self._ids.pop(0) if self._ids else None
+
+
+class VisitBuffer(WriteBehindBuffer):
+    thread_name = "visit-buffer"
+
+    def __init__(self):
+        super().__init__()
+        self.allocator = VisitIdAllocator()
+
+    @property
+    def flush_interval(self):
+        return settings.VISIT_BUFFER_FLUSH_INTERVAL
+
+    def add(self, row):
+        self._ensure_worker()
+        row["id"] = self.allocator.next_id()
+        with self._lock:
+            self._rows.append(row)
+            pending = len(self._rows)
+        if pending >= settings.VISIT_BUFFER_MAX:
+            # Backpressure: the request that fills the buffer pays for the flush.
+            self.flush()
+        elif pending >= settings.VISIT_BUFFER_FLUSH_SIZE:
+            self.wake()
+        return row["id"]
+
+    def _reset(self):
+        self._rows = []
+
+    def _take(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def _write(self, rows):
+        try:
+            replay_spool()
+        except Exception:
+            logger.exception("Could not replay the visit spool")
+        if not rows:
+            return []
+        try:
+            _bulk_insert(rows)
+            return []
+        except Exception:
+            logger.exception("Could not write %s buffered visit(s); spooling them", len(rows))
+        try:
+            spool_rows(rows)
+            return []
+        except Exception:
+            logger.exception("Could not spool %s visit(s); keeping them in memory", len(rows))
+            return rows
+
+    def _requeue(self, rows):
+        # Disk and database both failing: hold on to the newest rows, up to
+        # the buffer limit, for the next flush.
+        self._rows = (rows + self._rows)[-settings.VISIT_BUFFER_MAX :]
+
+
+def _bulk_insert(rows):
+    Visit.objects.bulk_create(
+        [Visit(**{key: value for key, value in row.items() if key != "id" or value}) for row in rows],
+        batch_size=500,
+        ignore_conflicts=any(row["id"] for row in rows),
+    )
+    # The rows are committed by now; a cache outage must not make the caller
+    # treat them as unwritten and spool them a second time.
+    try:
+        invalidate_profile_stats(row["profile_id"] for row in rows)
+    except Exception:
+        logger.exception("Could not invalidate dashboard stats")
+
+
+def spool_path(pid=None):
+    return Path(settings.VISIT_SPOOL_DIR) / f"visits-{pid or os.getpid()}.ndjson"
+
+
+def spool_rows(rows):
+    if not rows:
+        return
+    path = spool_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as handle:
+        for row in rows:
+            record = {key: row.get(key) for key in VISIT_FIELDS}
+            record["visited_at"] = row["visited_at"].isoformat()
+            handle.write(json.dumps(record) + "\n")
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def _read_spool_line(line):
+    record = json.loads(line)
+    record["visited_at"] = datetime.fromisoformat(record["visited_at"])
+    return {key: record[key] for key in VISIT_FIELDS}
+
+
+def replay_spool(path=None):
+    path = path or spool_path()
+    if not path.exists():
+        return 0
+    rows, good, bad = [], [], []
+    with path.open(encoding="utf-8", errors="replace") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            try:
+                rows.append(_read_spool_line(line))
+                good.append(line)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # Usually the last line, cut short by a crash or a full disk.
+                bad.append(line if line.endswith("\n") else line + "\n")
+    if bad:
+        # Set the unreadable lines aside so they cannot block the rest again.
+        with path.with_name(path.name + ".bad").open("a", encoding="utf-8") as handle:
+            handle.writelines(bad)
+        partial = path.with_name(path.name + ".tmp")
+        partial.write_text("".join(good), encoding="utf-8")
+        os.replace(partial, path)
+        logger.warning("Moved %s unreadable line(s) from %s to a .bad file", len(bad), path)
+    # bulk_create is atomic and spooled rows keep their reserved ids, so a
+    # failed replay leaves the file in place and is safe to run again.
+    if rows:
+        _bulk_insert(rows)
+    path.unlink()
+    return len(rows)
+
+
+visit_buffer = VisitBuffer()
+
+
+def bot_hit_key(profile_id, day, kind):
+    return f"bot-hits:{profile_id}:{day.isoformat()}:{kind}"
+
+
+def count_bot_hit(profile_id, kind):
+    key = bot_hit_key(profile_id, timezone.localdate(), kind)
+    cache.add(key, 0, BOT_HIT_TIMEOUT)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, BOT_HIT_TIMEOUT)
+
+
+def bot_hits(profile_id, day):
+    keys = {bot_hit_key(profile_id, day, kind): kind for kind in BOT_HIT_KINDS}
+    counts = cache.get_many(keys)
+    return {kind: counts.get(key, 0) for key, kind in keys.items()}
+
+
+def log_visit(request, profile_id, referrer=None):
+    agent = classify_user_agent(request.META.get("HTTP_USER_AGENT", ""))
+    if agent.is_bot and settings.BOT_VISIT_POLICY != "record":
+        if settings.BOT_VISIT_POLICY == "count":
+            count_bot_hit(profile_id, agent.kind)
+        return None
+    row = build_visit_row(request, profile_id, referrer=referrer)
+    if not agent.is_bot:
+        record_visitor(profile_id, get_client_ip(request), row["user_agent"])
+    if settings.VISIT_WRITE_BEHIND:
+        visit_id = visit_buffer.add(row)
+        count_visit()
+        return visit_id
+    row.pop("id")
+    visit_id = Visit.objects.create(**row).id
+    # Counted only once the row exists, so a failed insert never drifts the total.
+    count_visit()
+    invalidate_profile_stats([profile_id])
+    return visit_id
+
+
+def sign_visit(profile_id, visit_id):
+    return signing.dumps([profile_id, visit_id], salt=VISIT_TOKEN_SALT)
+
+
+def read_visit_token(token):
+    if not token:
+        return None
+    try:
+        profile_id, visit_id = signing.loads(
+            token, salt=VISIT_TOKEN_SALT, max_age=settings.VISIT_TOKEN_MAX_AGE
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return profile_id, visit_id
@@ -4,3 +4,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thinktechbizcards.settings")
 
 application = get_asgi_application()
+
+from cards.resolver import warm_profile_resolver  # noqa: E402
+
+warm_profile_resolver()
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "cards",
 ]
 
@@ -104,3 +105,63 @@ DEFAULT_FROM_EMAIL = os.getenv(
     "DJANGO_DEFAULT_FROM_EMAIL", "no-reply@thinktechbizcards.com"
 )
 SITE_URL = os.getenv("SITE_URL", "http://127.0.0.1:8000")
+
+cache_url = os.getenv("DJANGO_CACHE_URL")
+if cache_url:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": cache_url,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+PROFILE_PAGE_CACHE_TIMEOUT = int(os.getenv("PROFILE_PAGE_CACHE_TIMEOUT", "300"))
+
+PROFILE_RESOLVER_ENABLED = os.getenv("PROFILE_RESOLVER_ENABLED", "true").lower() == "true"
+PROFILE_RESOLVER_NEGATIVE_TTL = int(os.getenv("PROFILE_RESOLVER_NEGATIVE_TTL", "60"))
+
+VISIT_WRITE_BEHIND = os.getenv("VISIT_WRITE_BEHIND", "false").lower() == "true"
+VISIT_BUFFER_FLUSH_SIZE = int(os.getenv("VISIT_BUFFER_FLUSH_SIZE", "500"))
+VISIT_BUFFER_FLUSH_INTERVAL = float(os.getenv("VISIT_BUFFER_FLUSH_INTERVAL", "2"))
+VISIT_BUFFER_MAX = int(os.getenv("VISIT_BUFFER_MAX", "5000"))
+VISIT_SPOOL_DIR = os.getenv("VISIT_SPOOL_DIR", str(BASE_DIR / "var" / "visit-spool"))
+
+VISIT_TOKEN_MAX_AGE = int(os.getenv("VISIT_TOKEN_MAX_AGE", str(60 * 60 * 24)))
+
+PROFILE_HTTP_CACHING = os.getenv("PROFILE_HTTP_CACHING", "false").lower() == "true"
+PROFILE_HTTP_MAX_AGE = int(os.getenv("PROFILE_HTTP_MAX_AGE", "60"))
+
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR", str(BASE_DIR / "var" / "qr"))
+QR_HTTP_MAX_AGE = int(os.getenv("QR_HTTP_MAX_AGE", "3600"))
+QR_CACHE_MAX_AGE_DAYS = int(os.getenv("QR_CACHE_MAX_AGE_DAYS", "30"))
+
+# "record" keeps full Visit rows for bots, "count" only bumps a per-day cache
+# counter, "skip" ignores them.
+BOT_VISIT_POLICY = os.getenv("BOT_VISIT_POLICY", "count")
+
+# Visit.ip_hash is an HMAC whose salt changes every N days.
+VISITOR_HASH_ROTATION_DAYS = max(int(os.getenv("VISITOR_HASH_ROTATION_DAYS", "1")), 1)
+
+# archive_events exports raw visits/actions older than this many months to
+# EVENT_ARCHIVE_DIR and drops them; the daily rollups are kept.
+EVENT_RETENTION_MONTHS = int(os.getenv("EVENT_RETENTION_MONTHS", "13"))
+EVENT_ARCHIVE_DIR = os.getenv("EVENT_ARCHIVE_DIR", str(BASE_DIR / "var" / "event-archive"))
+
+# Ops dashboard counters are fresh for DASHBOARD_CACHE_TIMEOUT seconds, then
+# served stale for up to DASHBOARD_CACHE_STALE more while one refresh runs.
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv("DASHBOARD_CACHE_TIMEOUT", "30"))
+DASHBOARD_CACHE_STALE = int(os.getenv("DASHBOARD_CACHE_STALE", "300"))
+
+# Client portal stats are cached per profile for this many seconds, and
+# dropped earlier when new visits or actions for the profile are written.
+CLIENT_DASHBOARD_CACHE_TIMEOUT = int(os.getenv("CLIENT_DASHBOARD_CACHE_TIMEOUT", "60"))
+
+# Local numbers ("024 123 4567") are stored in Customer.phone_normalized with
+# this country code in place of the leading 0.
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "233")